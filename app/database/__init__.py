@@ -1 +1,16 @@
-from .memory import fake_db, token_store
+from app.settings import get_settings
+from .base import UserRepository, TokenStore, Storage
+from .memory import InMemoryUserRepository, InMemoryStorage
+
+
+def _create_storage() -> Storage:
+    settings = get_settings()
+    if settings.storage_backend == "sqlite":
+        from .sqlite import SQLiteStorage
+        return SQLiteStorage(settings.sqlite_path, batch_size=settings.sqlite_batch_size)
+    return InMemoryStorage()
+
+
+storage = _create_storage()
+user_repository = storage.users
+token_store = storage.tokens
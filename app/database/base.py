@@ -0,0 +1,65 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, MutableMapping
+
+from app.models import User, SpotifyToken
+
+TokenStore = MutableMapping[int, SpotifyToken]
+
+
+class UserRepository(ABC):
+
+    @abstractmethod
+    def next_id(self) -> int:
+        ...
+
+    @abstractmethod
+    def add(self, user: User) -> User:
+        ...
+
+    @abstractmethod
+    def get(self, user_id: int) -> Optional[User]:
+        ...
+
+    @abstractmethod
+    def update(self, user: User) -> User:
+        ...
+
+    @abstractmethod
+    def delete(self, user_id: int) -> Optional[User]:
+        ...
+
+    @abstractmethod
+    def list(self) -> List[User]:
+        ...
+
+    @abstractmethod
+    def list_page(self, after: int = 0, limit: int = 100) -> List[User]:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def __iter__(self) -> Iterator[User]:
+        return iter(self.list())
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.get(user_id) is not None
+
+
+class Storage(ABC):
+    users: UserRepository
+    tokens: TokenStore
+
+    async def startup(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
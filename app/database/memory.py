@@ -1,6 +1,69 @@
-from typing import List, Dict
+from bisect import bisect_left, bisect_right, insort
+from typing import List, Dict, Optional
 
-from app.models import User, SpotifyToken
+from app.models import User
+from .base import UserRepository, Storage, TokenStore
 
-fake_db: List[User] = []
-token_store: Dict[int, SpotifyToken] = {}
+
+class InMemoryUserRepository(UserRepository):
+
+    def __init__(self):
+        self._users: Dict[int, User] = {}
+        # the same ids, sorted, so a cursor page starts with a bisect whatever gaps deletes left
+        self._ids: List[int] = []
+        self._last_id = 0
+
+    def next_id(self) -> int:
+        self._last_id += 1
+        return self._last_id
+
+    def add(self, user: User) -> User:
+        if user.id not in self._users:
+            if not self._ids or user.id > self._ids[-1]:
+                self._ids.append(user.id)
+            else:
+                insort(self._ids, user.id)
+        self._users[user.id] = user
+        self._last_id = max(self._last_id, user.id)
+        return user
+
+    def get(self, user_id: int) -> Optional[User]:
+        return self._users.get(user_id)
+
+    def update(self, user: User) -> User:
+        self._users[user.id] = user
+        return user
+
+    def delete(self, user_id: int) -> Optional[User]:
+        user = self._users.pop(user_id, None)
+        if user is not None:
+            del self._ids[bisect_left(self._ids, user_id)]
+        return user
+
+    def list(self) -> List[User]:
+        return list(self._users.values())
+
+    def list_page(self, after: int = 0, limit: int = 100) -> List[User]:
+        start = bisect_right(self._ids, after)
+        return [self._users[user_id] for user_id in self._ids[start:start + limit]]
+
+    def clear(self) -> None:
+        self._users.clear()
+        self._ids.clear()
+        self._last_id = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __iter__(self):
+        return iter(self._users.values())
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._users
+
+
+class InMemoryStorage(Storage):
+
+    def __init__(self):
+        self.users = InMemoryUserRepository()
+        self.tokens: TokenStore = {}
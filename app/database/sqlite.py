@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from app.models import User, SpotifyToken
+from .base import Storage, TokenStore
+from .memory import InMemoryUserRepository
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS tokens (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+)
+
+UPSERT_USER = "INSERT INTO users (id, data) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET data = excluded.data"
+DELETE_USER = "DELETE FROM users WHERE id = ?"
+CLEAR_USERS = "DELETE FROM users"
+UPSERT_TOKEN = "INSERT INTO tokens (user_id, data) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET data = excluded.data"
+DELETE_TOKEN = "DELETE FROM tokens WHERE user_id = ?"
+CLEAR_TOKENS = "DELETE FROM tokens"
+SET_META = "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+
+_STOP = object()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, cached_statements=64)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    return conn
+
+
+class _Writer(threading.Thread):
+    # Applies queued writes on its own connection, one transaction per drained batch. Writes are
+    # acknowledged once queued, so a failing batch is retried in order with backoff, then applied
+    # op by op so only the writes SQLite keeps rejecting are lost; those are counted in
+    # failed_writes (the latest 1000 kept in failed_ops) rather than only logged.
+
+    def __init__(self, path: str, batch_size: int, retries: int = 3, retry_delay: float = 0.05):
+        super().__init__(name="sqlite-writer", daemon=True)
+        self._path = path
+        self._batch_size = batch_size
+        self._retries = retries
+        self._retry_delay = retry_delay
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self.batches = 0
+        self.writes = 0
+        self.retried_batches = 0
+        self.failed_writes = 0
+        self.failed_ops: Deque[Tuple[str, Tuple]] = deque(maxlen=1000)
+        self.last_error: Optional[str] = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, sql: str, params: Tuple = ()) -> None:
+        self._queue.put((sql, params))
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def stop(self) -> None:
+        self._queue.put(_STOP)
+        self.join()
+
+    def _drain(self, first: Any) -> List[Any]:
+        batch = [first]
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _grouped(ops: List[Tuple[str, Tuple]]) -> Iterator[Tuple[str, List[Tuple]]]:
+        # consecutive writes with the same statement go through a single executemany
+        current_sql, rows = None, []
+        for sql, params in ops:
+            if sql != current_sql and rows:
+                yield current_sql, rows
+                rows = []
+            current_sql = sql
+            rows.append(params)
+        if rows:
+            yield current_sql, rows
+
+    def _apply(self, conn: sqlite3.Connection, ops: List[Tuple[str, Tuple]]) -> None:
+        for attempt in range(self._retries + 1):
+            try:
+                with conn:
+                    for sql, rows in self._grouped(ops):
+                        conn.executemany(sql, rows)
+                self.batches += 1
+                self.writes += len(ops)
+                return
+            except sqlite3.Error as e:
+                self.last_error = str(e)
+                if attempt < self._retries:
+                    self.retried_batches += 1
+                    logger.warning(f"SQLite write batch of {len(ops)} operations failed ({e}), retrying")
+                    time.sleep(self._retry_delay * 2 ** attempt)
+
+        # still failing: one transaction per op, in order, so a single bad write can't sink the rest
+        for sql, params in ops:
+            try:
+                with conn:
+                    conn.execute(sql, params)
+                self.writes += 1
+            except sqlite3.Error as e:
+                self.last_error = str(e)
+                self.failed_writes += 1
+                self.failed_ops.append((sql, params))
+                logger.error(f"SQLite write lost after {self._retries} retries: {sql} ({e})")
+
+    def run(self) -> None:
+        conn = _connect(self._path)
+        try:
+            while True:
+                batch = self._drain(self._queue.get())
+                ops = [op for op in batch if op is not _STOP]
+                try:
+                    if ops:
+                        self._apply(conn, ops)
+                except Exception:
+                    # never let the writer thread die: later writes would queue up forever
+                    self.failed_writes += len(ops)
+                    logger.exception(f"SQLite write batch of {len(ops)} operations failed")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if len(ops) != len(batch):
+                    return
+        finally:
+            conn.close()
+
+
+class SQLiteUserRepository(InMemoryUserRepository):
+    # Write-behind: reads are served from memory, writes are persisted by the writer thread.
+
+    def __init__(self, writer: _Writer):
+        super().__init__()
+        self._writer = writer
+
+    def load(self, users: List[User], last_id: int) -> None:
+        super().clear()
+        for user in users:
+            super().add(user)
+        self._last_id = max(self._last_id, last_id)
+
+    def next_id(self) -> int:
+        user_id = super().next_id()
+        self._writer.submit(SET_META, ("last_user_id", user_id))
+        return user_id
+
+    def add(self, user: User) -> User:
+        super().add(user)
+        self._writer.submit(UPSERT_USER, (user.id, user.model_dump_json()))
+        return user
+
+    def update(self, user: User) -> User:
+        super().update(user)
+        self._writer.submit(UPSERT_USER, (user.id, user.model_dump_json()))
+        return user
+
+    def delete(self, user_id: int) -> Optional[User]:
+        user = super().delete(user_id)
+        if user is not None:
+            self._writer.submit(DELETE_USER, (user_id,))
+        return user
+
+    def clear(self) -> None:
+        super().clear()
+        self._writer.submit(CLEAR_USERS)
+        self._writer.submit(SET_META, ("last_user_id", 0))
+
+
+class SQLiteTokenStore(TokenStore):
+
+    def __init__(self, writer: _Writer):
+        self._tokens: Dict[int, SpotifyToken] = {}
+        self._writer = writer
+
+    def load(self, tokens: Dict[int, SpotifyToken]) -> None:
+        self._tokens = dict(tokens)
+
+    def __getitem__(self, user_id: int) -> SpotifyToken:
+        return self._tokens[user_id]
+
+    def __setitem__(self, user_id: int, token: SpotifyToken) -> None:
+        self._tokens[user_id] = token
+        self._writer.submit(UPSERT_TOKEN, (user_id, token.model_dump_json()))
+
+    def __delitem__(self, user_id: int) -> None:
+        del self._tokens[user_id]
+        self._writer.submit(DELETE_TOKEN, (user_id,))
+
+    def __iter__(self):
+        return iter(self._tokens)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def clear(self) -> None:
+        self._tokens.clear()
+        self._writer.submit(CLEAR_TOKENS)
+
+
+class SQLiteStorage(Storage):
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self._writer = _Writer(path, batch_size)
+        self.users = SQLiteUserRepository(self._writer)
+        self.tokens = SQLiteTokenStore(self._writer)
+
+    def _load(self) -> None:
+        conn = _connect(self.path)
+        try:
+            users = [User.model_validate_json(data) for (data,) in conn.execute("SELECT data FROM users ORDER BY id")]
+            tokens = {
+                user_id: SpotifyToken.model_validate_json(data)
+                for user_id, data in conn.execute("SELECT user_id, data FROM tokens")
+            }
+            row = conn.execute("SELECT value FROM meta WHERE key = 'last_user_id'").fetchone()
+        finally:
+            conn.close()
+        self.users.load(users, row[0] if row else 0)
+        self.tokens.load(tokens)
+        logger.info(f"Loaded {len(users)} users and {len(tokens)} tokens from {self.path}")
+
+    async def startup(self) -> None:
+        await asyncio.to_thread(self._load)
+        if self._writer.ident is not None and not self._writer.is_alive():
+            # a thread only starts once, so a restart after shutdown() gets a fresh writer
+            old = self._writer
+            self._writer = _Writer(self.path, old._batch_size, old._retries, old._retry_delay)
+            self.users._writer = self._writer
+            self.tokens._writer = self._writer
+        if not self._writer.is_alive():
+            self._writer.start()
+
+    async def flush(self) -> None:
+        if self._writer.is_alive():
+            await asyncio.to_thread(self._writer.flush)
+
+    async def shutdown(self) -> None:
+        if self._writer.is_alive():
+            await asyncio.to_thread(self._writer.stop)
+
+    def stats(self) -> Dict[str, Any]:
+        writer = self._writer
+        return {"path": self.path, "batches": writer.batches, "writes": writer.writes, "pending": writer.pending,
+                "retried_batches": writer.retried_batches, "failed_writes": writer.failed_writes,
+                "last_error": writer.last_error}
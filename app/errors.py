@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class AppError(Exception):
     pass
 
@@ -28,3 +31,25 @@ class AuthenticationError(AppError):
     def __init__(self, message: str = "Authentication required"):
         self.message = message
         super().__init__(self.message)
+
+
+class UpstreamRateLimitError(ExternalAPIError):
+
+    def __init__(self, service: str, retry_after: Optional[float] = None):
+        self.retry_after = retry_after
+        super().__init__(service, "rate limit exceeded, please retry later")
+
+
+class PreconditionFailedError(AppError):
+
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+
+class ServiceUnavailableError(AppError):
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        self.message = message
+        self.retry_after = retry_after
+        super().__init__(self.message)
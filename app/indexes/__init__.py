@@ -0,0 +1,19 @@
+from .base import UserIndex
+from .favorites import FavoritesIndex, FAVORITE_KINDS, favorites_of
+from .genres import GenreIndex
+from .ordered import AgeIndex, NamePrefixIndex
+from .popularity import PopularityIndex, RankedCounter
+from .query import Condition, matching_ids
+from .similarity import SimilarityIndex
+from .versions import VersionIndex
+
+favorites_index = FavoritesIndex()
+version_index = VersionIndex()
+genre_index = GenreIndex()
+age_index = AgeIndex()
+name_index = NamePrefixIndex()
+similarity_index = SimilarityIndex()
+popularity_index = PopularityIndex()
+
+user_indexes = [favorites_index, version_index, genre_index, age_index, name_index,
+                similarity_index, popularity_index]
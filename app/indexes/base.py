@@ -0,0 +1,24 @@
+from app.models import User
+
+
+class UserIndex:
+    # Derived structures kept in sync by UserService; every hook defaults to a no-op.
+
+    def add_user(self, user: User) -> None:
+        pass
+
+    def remove_user(self, user: User) -> None:
+        pass
+
+    def update_user(self, before: User, after: User) -> None:
+        self.remove_user(before)
+        self.add_user(after)
+
+    def add_favorite(self, user: User, kind: str, item) -> None:
+        pass
+
+    def remove_favorite(self, user: User, kind: str, item) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
@@ -0,0 +1,72 @@
+from collections import defaultdict
+from typing import Dict, Set
+
+from app.models import User
+from .base import UserIndex
+
+FAVORITE_KINDS = ("artist", "track")
+
+
+def favorites_of(user: User, kind: str):
+    return user.favorite_artists if kind == "artist" else user.favorite_tracks
+
+
+class FavoritesIndex(UserIndex):
+
+    def __init__(self):
+        self._by_user: Dict[str, Dict[int, Set[str]]] = {kind: defaultdict(set) for kind in FAVORITE_KINDS}
+        self._fans: Dict[str, Dict[str, Set[int]]] = {kind: defaultdict(set) for kind in FAVORITE_KINDS}
+
+    def has_favorite(self, user_id: int, kind: str, item_id: str) -> bool:
+        items = self._by_user[kind].get(user_id)
+        return items is not None and item_id in items
+
+    def fans(self, kind: str, item_id: str) -> Set[int]:
+        return self._fans[kind].get(item_id, set())
+
+    def favorited_ids(self, kind: str) -> Set[str]:
+        return set(self._fans[kind])
+
+    def _add(self, user_id: int, kind: str, item_id: str) -> None:
+        self._by_user[kind][user_id].add(item_id)
+        self._fans[kind][item_id].add(user_id)
+
+    def _remove(self, user_id: int, kind: str, item_id: str) -> None:
+        items = self._by_user[kind].get(user_id)
+        if items is not None:
+            items.discard(item_id)
+            if not items:
+                del self._by_user[kind][user_id]
+        fans = self._fans[kind].get(item_id)
+        if fans is not None:
+            fans.discard(user_id)
+            if not fans:
+                del self._fans[kind][item_id]
+
+    def add_user(self, user: User) -> None:
+        for kind in FAVORITE_KINDS:
+            for item in favorites_of(user, kind):
+                self._add(user.id, kind, item.id)
+
+    def remove_user(self, user: User) -> None:
+        for kind in FAVORITE_KINDS:
+            for item_id in self._by_user[kind].pop(user.id, set()):
+                fans = self._fans[kind][item_id]
+                fans.discard(user.id)
+                if not fans:
+                    del self._fans[kind][item_id]
+
+    def update_user(self, before: User, after: User) -> None:
+        # profile updates never touch favorites
+        pass
+
+    def add_favorite(self, user: User, kind: str, item) -> None:
+        self._add(user.id, kind, item.id)
+
+    def remove_favorite(self, user: User, kind: str, item) -> None:
+        self._remove(user.id, kind, item.id)
+
+    def clear(self) -> None:
+        for kind in FAVORITE_KINDS:
+            self._by_user[kind].clear()
+            self._fans[kind].clear()
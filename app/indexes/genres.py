@@ -0,0 +1,41 @@
+from collections import defaultdict
+from typing import Dict, Set
+
+from app.models import User
+from .base import UserIndex
+
+
+def genre_key(genre: str) -> str:
+    return genre.strip().casefold()
+
+
+class GenreIndex(UserIndex):
+    # Inverted index over music_preferences, matched case-insensitively.
+
+    def __init__(self):
+        self._users: Dict[str, Set[int]] = defaultdict(set)
+        self._genres_of: Dict[int, Set[str]] = {}
+
+    def users_with(self, genre: str) -> Set[int]:
+        return self._users.get(genre_key(genre), set())
+
+    def likes(self, user_id: int, genre: str) -> bool:
+        genres = self._genres_of.get(user_id)
+        return genres is not None and genre_key(genre) in genres
+
+    def add_user(self, user: User) -> None:
+        genres = {genre_key(genre) for genre in user.music_preferences}
+        self._genres_of[user.id] = genres
+        for genre in genres:
+            self._users[genre].add(user.id)
+
+    def remove_user(self, user: User) -> None:
+        for genre in self._genres_of.pop(user.id, set()):
+            users = self._users[genre]
+            users.discard(user.id)
+            if not users:
+                del self._users[genre]
+
+    def clear(self) -> None:
+        self._users.clear()
+        self._genres_of.clear()
@@ -0,0 +1,86 @@
+from bisect import bisect_left, insort
+from typing import Dict, Generic, List, Tuple, TypeVar
+
+from app.models import User
+from .base import UserIndex
+
+K = TypeVar("K")
+
+# Sorts after any string that a prefix can start, so [prefix, prefix + _PREFIX_END) covers every match
+_PREFIX_END = "\U0010ffff"
+
+
+class _OrderedIndex(UserIndex, Generic[K]):
+    # (key, user_id) pairs kept sorted, so a range of keys is two bisections away. Inserts and
+    # removals shift the list (a memmove), which stays cheap at the sizes this store holds.
+
+    def __init__(self):
+        self._entries: List[Tuple[K, int]] = []
+        self._key_of: Dict[int, K] = {}
+
+    def _key(self, user: User) -> K:
+        raise NotImplementedError
+
+    def _bounds(self, low: K, high: K) -> Tuple[int, int]:
+        # half-open [low, high): (key,) sorts before every (key, user_id)
+        return bisect_left(self._entries, (low,)), bisect_left(self._entries, (high,))
+
+    def add_user(self, user: User) -> None:
+        key = self._key(user)
+        self._key_of[user.id] = key
+        insort(self._entries, (key, user.id))
+
+    def remove_user(self, user: User) -> None:
+        key = self._key_of.pop(user.id, None)
+        if key is None:
+            return
+        position = bisect_left(self._entries, (key, user.id))
+        if position < len(self._entries) and self._entries[position] == (key, user.id):
+            del self._entries[position]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._key_of.clear()
+
+
+class AgeIndex(_OrderedIndex[int]):
+
+    def _key(self, user: User) -> int:
+        return user.age
+
+    def count_between(self, min_age: int, max_age: int) -> int:
+        low, high = self._bounds(min_age, max_age + 1)
+        return max(high - low, 0)
+
+    def users_between(self, min_age: int, max_age: int) -> List[int]:
+        low, high = self._bounds(min_age, max_age + 1)
+        return [user_id for _, user_id in self._entries[low:high]]
+
+    def is_between(self, user_id: int, min_age: int, max_age: int) -> bool:
+        age = self._key_of.get(user_id)
+        return age is not None and min_age <= age <= max_age
+
+
+def name_key(name: str) -> str:
+    return name.strip().casefold()
+
+
+class NamePrefixIndex(_OrderedIndex[str]):
+    # Case-insensitive prefix match on the full name.
+
+    def _key(self, user: User) -> str:
+        return name_key(user.name)
+
+    def count_with_prefix(self, prefix: str) -> int:
+        prefix = name_key(prefix)
+        low, high = self._bounds(prefix, prefix + _PREFIX_END)
+        return high - low
+
+    def users_with_prefix(self, prefix: str) -> List[int]:
+        prefix = name_key(prefix)
+        low, high = self._bounds(prefix, prefix + _PREFIX_END)
+        return [user_id for _, user_id in self._entries[low:high]]
+
+    def has_prefix(self, user_id: int, prefix: str) -> bool:
+        name = self._key_of.get(user_id)
+        return name is not None and name.startswith(name_key(prefix))
@@ -0,0 +1,163 @@
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from app.models import User
+from .base import UserIndex
+from .favorites import FAVORITE_KINDS, favorites_of
+from .genres import genre_key
+
+
+class RankedCounter:
+    # Counts kept grouped by value: one bucket of keys per distinct count, and the non-empty
+    # counts linked in order. A +1/-1 moves a key to the neighbouring bucket in O(1) and top(k)
+    # walks down from the highest count in O(k), however many keys there are. (A heap gives the
+    # same reads but O(log n) updates and stale entries to skip.)
+
+    def __init__(self):
+        self._counts: Dict[Hashable, int] = {}
+        # count -> keys with that count; a dict keeps ties in the order they reached the count
+        self._buckets: Dict[int, Dict[Hashable, None]] = {}
+        self._lower: Dict[int, int] = {}
+        self._higher: Dict[int, int] = {}
+        self._max = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def count(self, key: Hashable) -> int:
+        return self._counts.get(key, 0)
+
+    def _link_after(self, count: int, new: int) -> None:
+        # insert the empty bucket `new` just above `count` (0 stands for the bottom)
+        higher = self._higher.get(count)
+        self._buckets[new] = {}
+        self._lower[new] = count
+        if higher is None:
+            self._max = new
+        else:
+            self._higher[new] = higher
+            self._lower[higher] = new
+        self._higher[count] = new
+
+    def _link_before(self, count: int, new: int) -> None:
+        # insert the empty bucket `new` just below `count`
+        lower = self._lower[count]
+        self._buckets[new] = {}
+        self._lower[new] = lower
+        self._higher[new] = count
+        self._higher[lower] = new
+        self._lower[count] = new
+
+    def _drop_if_empty(self, count: int) -> None:
+        if self._buckets[count]:
+            return
+        del self._buckets[count]
+        lower = self._lower.pop(count)
+        higher = self._higher.pop(count, None)
+        if higher is None:
+            self._higher.pop(lower, None)
+            self._max = lower
+        else:
+            self._higher[lower] = higher
+            self._lower[higher] = lower
+
+    def increment(self, key: Hashable) -> None:
+        count = self._counts.get(key, 0)
+        if count + 1 not in self._buckets:
+            self._link_after(count, count + 1)
+        self._buckets[count + 1][key] = None
+        self._counts[key] = count + 1
+        if count:
+            del self._buckets[count][key]
+            self._drop_if_empty(count)
+
+    def decrement(self, key: Hashable) -> None:
+        count = self._counts.get(key)
+        if count is None:
+            return
+        if count > 1:
+            if count - 1 not in self._buckets:
+                self._link_before(count, count - 1)
+            self._buckets[count - 1][key] = None
+            self._counts[key] = count - 1
+        else:
+            del self._counts[key]
+        del self._buckets[count][key]
+        self._drop_if_empty(count)
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        result = []
+        count = self._max
+        while count and (k is None or len(result) < k):
+            for key in self._buckets[count]:
+                result.append((key, count))
+                if k is not None and len(result) == k:
+                    break
+            count = self._lower[count]
+        return result
+
+    def clear(self) -> None:
+        self._counts.clear()
+        self._buckets.clear()
+        self._lower.clear()
+        self._higher.clear()
+        self._max = 0
+
+
+class PopularityIndex(UserIndex):
+    # How many users like each genre and have each artist and track as a favorite, with the last
+    # seen spelling of a genre and the name of an artist or track kept for display.
+
+    def __init__(self):
+        self.genres = RankedCounter()
+        self.favorites: Dict[str, RankedCounter] = {kind: RankedCounter() for kind in FAVORITE_KINDS}
+        self._labels: Dict[str, Dict[str, str]] = {kind: {} for kind in ("genre", *FAVORITE_KINDS)}
+
+    def label(self, kind: str, key: str) -> str:
+        return self._labels[kind].get(key, key)
+
+    def _genres(self, user: User) -> Dict[str, str]:
+        return {genre_key(genre): genre for genre in user.music_preferences}
+
+    def _count(self, counter: RankedCounter, kind: str, key: str, label: str) -> None:
+        counter.increment(key)
+        self._labels[kind][key] = label
+
+    def _uncount(self, counter: RankedCounter, kind: str, key: str) -> None:
+        counter.decrement(key)
+        if not counter.count(key):
+            self._labels[kind].pop(key, None)
+
+    def add_user(self, user: User) -> None:
+        for key, genre in self._genres(user).items():
+            self._count(self.genres, "genre", key, genre)
+        for kind in FAVORITE_KINDS:
+            for item in favorites_of(user, kind):
+                self._count(self.favorites[kind], kind, item.id, item.name)
+
+    def remove_user(self, user: User) -> None:
+        for key in self._genres(user):
+            self._uncount(self.genres, "genre", key)
+        for kind in FAVORITE_KINDS:
+            for item in favorites_of(user, kind):
+                self._uncount(self.favorites[kind], kind, item.id)
+
+    def update_user(self, before: User, after: User) -> None:
+        # profile updates never touch favorites, so only the genre difference is counted
+        old, new = self._genres(before), self._genres(after)
+        for key in old.keys() - new.keys():
+            self._uncount(self.genres, "genre", key)
+        for key in new.keys() - old.keys():
+            self._count(self.genres, "genre", key, new[key])
+
+    def add_favorite(self, user: User, kind: str, item) -> None:
+        self._count(self.favorites[kind], kind, item.id, item.name)
+
+    def remove_favorite(self, user: User, kind: str, item) -> None:
+        self._uncount(self.favorites[kind], kind, item.id)
+
+    def clear(self) -> None:
+        self.genres.clear()
+        for counter in self.favorites.values():
+            counter.clear()
+        for labels in self._labels.values():
+            labels.clear()
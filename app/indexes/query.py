@@ -0,0 +1,22 @@
+from typing import Callable, Iterable, List, NamedTuple, Set
+
+
+class Condition(NamedTuple):
+    # size is the index's count of matching users, known without materializing them
+    size: int
+    ids: Callable[[], Iterable[int]]
+    matches: Callable[[int], bool]
+
+
+def matching_ids(conditions: List[Condition]) -> Set[int]:
+    # Only the most selective condition is materialized; the rest are checked per candidate with
+    # O(1) lookups, most selective first, so a broad age range next to a rare genre stays cheap.
+    plan = sorted(conditions, key=lambda condition: condition.size)
+    if plan[0].size == 0:
+        return set()
+    candidates = set(plan[0].ids())
+    for condition in plan[1:]:
+        candidates = {user_id for user_id in candidates if condition.matches(user_id)}
+        if not candidates:
+            break
+    return candidates
@@ -0,0 +1,179 @@
+import heapq
+import random
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.models import User
+from .base import UserIndex
+from .favorites import FAVORITE_KINDS, favorites_of
+from .genres import genre_key
+
+_MASK = (1 << 64) - 1
+
+
+def user_items(user: User) -> Set[str]:
+    items = {f"g:{genre_key(genre)}" for genre in user.music_preferences}
+    for kind in FAVORITE_KINDS:
+        items.update(f"{kind[0]}:{item.id}" for item in favorites_of(user, kind))
+    return items
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared) if shared else 0.0
+
+
+class SimilarityIndex(UserIndex):
+    # MinHash LSH over each user's genres and favorite artists and tracks. A user's signature has
+    # bands * rows minimums of a seeded hash over their items, and each band of rows values is one
+    # bucket key; two users with Jaccard similarity J share at least one bucket with probability
+    # 1 - (1 - J**rows)**bands. Queries score exactly only the users found in the same buckets,
+    # smallest buckets first and at most max_candidates of them. Below exact_below users a full
+    # scan is cheaper than that, so small stores are always answered exactly.
+    # Signatures cost ~0.1 ms per user, so the startup rebuild leaves the index empty. Small stores
+    # fill it in place with ensure_built(); large ones compute the tables off the event loop
+    # (begin_build, compute, finish_build) while the hooks note which users changed meanwhile, and
+    # those are redone once the tables are installed. The hooks keep it current from then on.
+    # Item hashes come from hash(), so signatures only mean something inside one process.
+
+    def __init__(self, bands: int = 16, rows: int = 3, max_candidates: int = 5000, exact_below: int = 5000,
+                 seed: int = 0x5EED):
+        rng = random.Random(seed)
+        self.bands = bands
+        self.rows = rows
+        self.max_candidates = max_candidates
+        self.exact_below = exact_below
+        # multiply-add hashing with odd multipliers: one cheap 64-bit permutation per signature row
+        self._seeds = [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for _ in range(bands * rows)]
+        self._items: Dict[int, Set[str]] = {}
+        self._keys: Dict[int, List[int]] = {}
+        self._buckets: Dict[int, Set[int]] = defaultdict(set)
+        self._built = False
+        self._pending: Optional[Set[int]] = None
+        self._generation = 0
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    @property
+    def building(self) -> bool:
+        return self._pending is not None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def ensure_built(self, users: Iterable[User]) -> None:
+        if not self._built:
+            self._items, self._keys, self._buckets = self.compute(users)
+            self._built = True
+            self._pending = None
+
+    def compute(self, users: Iterable[User]) -> Tuple[Dict[int, Set[str]], Dict[int, List[int]], Dict[int, Set[int]]]:
+        # reads only the seeds, so it can run in a worker thread while the index is in use
+        items_by_user, keys_by_user, buckets = {}, {}, defaultdict(set)
+        for user in users:
+            items = user_items(user)
+            if not items:
+                continue
+            keys = self._band_keys(items)
+            items_by_user[user.id] = items
+            keys_by_user[user.id] = keys
+            for key in keys:
+                buckets[key].add(user.id)
+        return items_by_user, keys_by_user, buckets
+
+    def begin_build(self) -> int:
+        self._pending = set()
+        return self._generation
+
+    def finish_build(self, generation: int, tables, current: Callable[[int], Optional[User]]) -> None:
+        if generation != self._generation or self._built:
+            return  # cleared (or built in place) while the tables were being computed
+        self._items, self._keys, self._buckets = tables
+        self._built = True
+        pending, self._pending = self._pending or set(), None
+        for user_id in pending:
+            self._discard(user_id)
+            user = current(user_id)
+            if user is not None:
+                self._insert(user)
+
+    def _band_keys(self, items: Iterable[str]) -> List[int]:
+        seeds = self._seeds
+        # one row of permuted hashes per item, then the column-wise minimum
+        permuted = [[(h * a + b) & _MASK for a, b in seeds] for h in map(hash, items)]
+        signature = list(map(min, zip(*permuted)))
+        rows = self.rows
+        return [hash((band, *signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def _insert(self, user: User) -> None:
+        items = user_items(user)
+        if not items:
+            return
+        keys = self._band_keys(items)
+        self._items[user.id] = items
+        self._keys[user.id] = keys
+        for key in keys:
+            self._buckets[key].add(user.id)
+
+    def _discard(self, user_id: int) -> None:
+        self._items.pop(user_id, None)
+        for key in self._keys.pop(user_id, ()):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _candidates(self, user_id: int) -> Iterable[int]:
+        if len(self._items) < self.exact_below:
+            return self._items.keys()
+        candidates = set()
+        for bucket in sorted((self._buckets[key] for key in self._keys[user_id]), key=len):
+            for other in bucket:
+                candidates.add(other)
+                if len(candidates) > self.max_candidates:
+                    return candidates
+        return candidates
+
+    def similar(self, user_id: int, k: int) -> List[Tuple[int, float]]:
+        items = self._items.get(user_id)
+        if not items:
+            return []
+        scored = [(jaccard(items, self._items[other]), other)
+                  for other in self._candidates(user_id) if other != user_id]
+        top = heapq.nlargest(k, scored, key=lambda pair: (pair[0], -pair[1]))
+        return [(other, score) for score, other in top if score > 0]
+
+    def _reinsert(self, user: User) -> None:
+        if self._built:
+            self._discard(user.id)
+            self._insert(user)
+        elif self._pending is not None:
+            self._pending.add(user.id)
+
+    def add_user(self, user: User) -> None:
+        self._reinsert(user)
+
+    def remove_user(self, user: User) -> None:
+        if self._pending is not None:
+            self._pending.add(user.id)
+        self._discard(user.id)
+
+    def update_user(self, before: User, after: User) -> None:
+        self._reinsert(after)
+
+    def add_favorite(self, user: User, kind: str, item) -> None:
+        self._reinsert(user)
+
+    def remove_favorite(self, user: User, kind: str, item) -> None:
+        self._reinsert(user)
+
+    def clear(self) -> None:
+        self._items = {}
+        self._keys = {}
+        self._buckets = defaultdict(set)
+        self._built = False
+        self._pending = None
+        self._generation += 1
@@ -0,0 +1,52 @@
+import secrets
+from typing import Dict, Optional
+
+from app.models import User
+from .base import UserIndex
+
+
+class VersionIndex(UserIndex):
+    # Every change takes the next value of one global counter, so the counter doubles as the
+    # collection version. The epoch keeps ETags from one process run from matching another's.
+
+    def __init__(self, epoch: Optional[str] = None):
+        self.epoch = epoch or secrets.token_hex(4)
+        self._versions: Dict[int, int] = {}
+        self._counter = 0
+
+    def touch(self, user_id: int) -> None:
+        self._counter += 1
+        self._versions[user_id] = self._counter
+
+    def version(self, user_id: int) -> Optional[int]:
+        return self._versions.get(user_id)
+
+    def etag(self, user_id: int) -> Optional[str]:
+        version = self._versions.get(user_id)
+        return None if version is None else f'"{self.epoch}-{version}"'
+
+    def collection_etag(self, *variant) -> str:
+        # variant tells apart representations of the same version, e.g. the pages of a listing
+        suffix = "".join(f"-{part}" for part in variant)
+        return f'"{self.epoch}-c{self._counter}{suffix}"'
+
+    def add_user(self, user: User) -> None:
+        self.touch(user.id)
+
+    def remove_user(self, user: User) -> None:
+        self._versions.pop(user.id, None)
+        self._counter += 1
+
+    def update_user(self, before: User, after: User) -> None:
+        self.touch(after.id)
+
+    def add_favorite(self, user: User, kind: str, item) -> None:
+        self.touch(user.id)
+
+    def remove_favorite(self, user: User, kind: str, item) -> None:
+        self.touch(user.id)
+
+    def clear(self) -> None:
+        # the counter keeps going so an ETag handed out before the clear can't match again
+        self._versions.clear()
+        self._counter += 1
@@ -0,0 +1,33 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable, List
+
+
+class KeyedLock:
+    # One asyncio.Lock per key, created on first use and dropped as soon as nobody holds or waits
+    # for it: writers to different keys never contend, and the table only holds keys in use.
+
+    def __init__(self):
+        self._locks: Dict[Hashable, List] = {}  # key -> [lock, holders + waiters]
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            # also runs when cancelled while waiting, so an abandoned wait can't pin the entry
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def locked(self, key: Hashable) -> bool:
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    def __len__(self) -> int:
+        return len(self._locks)
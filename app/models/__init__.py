@@ -1,12 +1,17 @@
 from .spotify import SpotifyToken, SpotifyArtist, SpotifyTrack, SpotifyImage
-from .user import User, UserCreate, UserBase
+from .stats import GenreCount, FavoriteCount
+from .user import User, UserCreate, UserBase, SimilarUser, FavoritesBatchRequest
 
 __all__ = [
     "User",
     "UserCreate",
     "UserBase",
+    "SimilarUser",
+    "FavoritesBatchRequest",
     "SpotifyToken",
     "SpotifyArtist",
     "SpotifyTrack",
-    "SpotifyImage"
+    "SpotifyImage",
+    "GenreCount",
+    "FavoriteCount"
 ]
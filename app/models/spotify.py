@@ -1,7 +1,7 @@
 import time
 from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, AliasChoices, AliasPath
 
 
 class SpotifyImage(BaseModel):
@@ -26,7 +26,8 @@ class SpotifyTrack(BaseModel):
     duration_ms: int
     explicit: bool
     artists: List[SpotifyArtist] = Field(default_factory=list)
-    album_name: str
+    # also accepts Spotify's own track shape, where the name lives in album.name
+    album_name: str = Field(validation_alias=AliasChoices("album_name", AliasPath("album", "name")))
     href: str
     uri: str
 
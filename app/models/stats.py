@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+
+
+class GenreCount(BaseModel):
+    genre: str
+    users: int = Field(..., description="Users with this genre in their music preferences")
+
+
+class FavoriteCount(BaseModel):
+    id: str
+    name: str
+    favorites: int = Field(..., description="Users with this item among their favorites")
@@ -35,3 +35,12 @@ class User(UserBase):
     id: int
     favorite_artists: List[SpotifyArtist] = Field(default_factory=list)
     favorite_tracks: List[SpotifyTrack] = Field(default_factory=list)
+
+
+class SimilarUser(BaseModel):
+    user: User
+    similarity: float = Field(..., description="Jaccard similarity of genres and favorite artists and tracks")
+
+
+class FavoritesBatchRequest(BaseModel):
+    names: List[str] = Field(..., min_length=1, max_length=50, description="Artist or track names to search and save")
@@ -0,0 +1,181 @@
+import asyncio
+import cProfile
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Opt-in per-request timing. Code marks spans with `with profiling.span("name")`; when the
+# current request isn't being profiled that is one ContextVar lookup and a shared no-op.
+
+PROFILE_HEADER = b"x-profile"
+CPROFILE_VALUE = "cprofile"
+_OFF_VALUES = {"", "0", "false", "off", "no"}
+
+
+class Profile:
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        # name -> [total seconds, count], in first-seen order
+        self.spans: Dict[str, List[float]] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        # spans can nest and run concurrently (gathered lookups), so they don't have to add up to total
+        parts = [f'{name};dur={seconds * 1000:.2f};desc="x{int(count)}"' if count > 1
+                 else f"{name};dur={seconds * 1000:.2f}"
+                 for name, (seconds, count) in self.spans.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[Profile]] = ContextVar("profile", default=None)
+
+
+class _Span:
+    __slots__ = ("profile", "name", "started_at")
+
+    def __init__(self, profile: Profile, name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.record(self.name, time.perf_counter() - self.started_at)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str):
+    profile = _current.get()
+    return _NO_SPAN if profile is None else _Span(profile, name)
+
+
+def record(name: str, seconds: float) -> None:
+    profile = _current.get()
+    if profile is not None:
+        profile.record(name, seconds)
+
+
+def mark(name: str) -> None:
+    # time from the start of the request until now, e.g. routing and request validation
+    profile = _current.get()
+    if profile is not None:
+        profile.record(name, time.perf_counter() - profile.started_at)
+
+
+def _dump_name(method: str, path: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    return f"{time.time_ns()}-{method}-{slug}.prof"
+
+
+def _write_dump(profiler: cProfile.Profile, target: Path) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(str(target))
+
+
+class ProfilingMiddleware:
+    # Profiles a request when it sends `X-Profile: 1` (if header_enabled, off by default since it
+    # lets any caller see internal timings and write dumps) or is picked by
+    # sample_rate. `X-Profile: cprofile` also runs cProfile for the request and writes the stats
+    # to dump_dir; cProfile sees the whole thread, so only one such request runs at a time and
+    # any others overlapping it only get the Server-Timing spans. Options left as None are read
+    # from the settings on the first request.
+
+    def __init__(self, app, sample_rate: Optional[float] = None, header_enabled: Optional[bool] = None,
+                 dump_dir: Optional[str] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.header_enabled = header_enabled
+        self.dump_dir = Path(dump_dir) if dump_dir else None
+        self._configured = False
+        self._cprofile_lock = asyncio.Lock()
+
+    def _configure(self) -> None:
+        settings = get_settings()
+        if self.sample_rate is None:
+            self.sample_rate = settings.profiling_sample_rate
+        if self.header_enabled is None:
+            self.header_enabled = settings.profiling_header_enabled
+        if self.dump_dir is None and settings.profiling_dump_dir:
+            self.dump_dir = Path(settings.profiling_dump_dir)
+        self._configured = True
+
+    def _requested(self, scope) -> Optional[str]:
+        if not self.header_enabled:
+            return None
+        for key, value in scope["headers"]:
+            if key == PROFILE_HEADER:
+                value = value.decode("latin-1").strip().lower()
+                return None if value in _OFF_VALUES else value
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if not self._configured:
+            self._configure()
+
+        requested = self._requested(scope)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not requested and not sampled:
+            return await self.app(scope, receive, send)
+
+        profile = Profile()
+        token = _current.set(profile)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing = profile.server_timing(time.perf_counter() - profile.started_at)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            if requested == CPROFILE_VALUE and self.dump_dir is not None and not self._cprofile_lock.locked():
+                async with self._cprofile_lock:
+                    await self._run_with_cprofile(scope, receive, send_with_timing)
+            else:
+                await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+
+    async def _run_with_cprofile(self, scope, receive, send) -> None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.disable()
+            target = self.dump_dir / _dump_name(scope["method"], scope["path"])
+            await asyncio.to_thread(_write_dump, profiler, target)
+            logger.info(f"cProfile for {scope['method']} {scope['path']} written to {target}")
@@ -1,2 +1,4 @@
+from .metrics import router as metrics_router
 from .spotify import router as spotify_router
+from .stats import router as stats_router
 from .users import router as users_router
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+
+from app import metrics
+
+router = APIRouter(tags=["Monitoring"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,45 @@
+from typing import Any, List, Optional
+
+from fastapi import Request, Response
+from pydantic import BaseModel, TypeAdapter
+
+from app import profiling
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+# Service results are already validated models, so these write them straight to JSON instead of
+# letting response_model validate and serialize them a second time. The decorators keep their
+# response_model for the OpenAPI schema.
+def model_response(model: BaseModel, status_code: int = 200, **kwargs) -> Response:
+    with profiling.span("serialize"):
+        body = model.model_dump_json()
+    return Response(body, status_code=status_code, media_type=JSON_MEDIA_TYPE, **kwargs)
+
+
+def list_response(adapter: TypeAdapter, items: List[Any], status_code: int = 200, **kwargs) -> Response:
+    with profiling.span("serialize"):
+        body = adapter.dump_json(items)
+    return Response(body, status_code=status_code, media_type=JSON_MEDIA_TYPE, **kwargs)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so a W/ prefix on the client's copy still matches
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag})
+
+
+def if_match_satisfied(request: Request, etag: str) -> bool:
+    # If-Match uses the strong comparison: weak tags never match. No header means an unconditional write.
+    header = request.headers.get("if-match")
+    if header is None or header.strip() == "*":
+        return True
+    return any(tag.strip() == etag for tag in header.split(","))
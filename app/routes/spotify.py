@@ -1,9 +1,12 @@
-from typing import List, Literal
+import json
+from typing import List, Literal, Optional, AsyncIterator
 
-from fastapi import APIRouter, HTTPException, Query, Body
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, HTTPException, Query, Body, Response, Request
+from fastapi.responses import RedirectResponse, StreamingResponse
 
+from app.errors import AppError
 from app.services import UserService, SpotifyService
+from .streaming import wants_ndjson, ndjson_response
 
 router = APIRouter(prefix="/spotify", tags=["Spotify"])
 
@@ -18,20 +21,77 @@ async def login_spotify(user_id: int):
     return RedirectResponse(url)
 
 
+def _raise_search_error(data: dict):
+    raise HTTPException(400 if data["error"] != "no_valid_token" else 401, detail=data)
+
+
+def _accepts_encoding(request: Request, encoding: str) -> bool:
+    # an explicit entry for the encoding wins over "*"; q=0 means "not acceptable"
+    weights = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        key, _, value = params.partition("=")
+        if key.strip().lower() == "q":
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+    weight = weights.get(encoding.lower(), weights.get("*", 0.0))
+    return weight > 0
+
+
+async def _relay(upstream, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # closes the upstream response even when the relay stops early (read error, client gone)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await upstream.aclose()
+
+
+async def _search_passthrough(request: Request, user_id: int, q: str, type_: str, market: Optional[str],
+                              stream: bool) -> Response:
+    # Spotify's bytes go back untouched: no json decode here, no re-encode by FastAPI
+    headers = {"Cache-Control": f"public, max-age={SpotifyService.search_cache_max_age()}"}
+
+    if stream:
+        upstream = await SpotifyService.open_search_stream(user_id, q, type_, market)
+        if isinstance(upstream, dict):
+            _raise_search_error(upstream)
+        # the pooled client always asks Spotify for gzip, so relay the compressed bytes only to
+        # callers that accept that encoding and decode them for everyone else
+        encoding = upstream.headers.get("content-encoding")
+        if encoding and _accepts_encoding(request, encoding):
+            headers["Content-Encoding"] = encoding
+            body = upstream.aiter_raw()
+        else:
+            body = upstream.aiter_bytes()
+        if encoding:
+            headers["Vary"] = "Accept-Encoding"
+        return StreamingResponse(_relay(upstream, body), media_type="application/json", headers=headers)
+
+    search = SpotifyService.search_artists_raw if type_ == "artist" else SpotifyService.search_tracks_raw
+    body = await search(user_id, q, market)
+    if isinstance(body, dict):
+        _raise_search_error(body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/search/artist")
-async def search_artist(user_id: int, q: str):
-    data = await SpotifyService.search_artists_raw(user_id, q)
-    if "error" in data:
-        raise HTTPException(400 if data["error"] != "no_valid_token" else 401, detail=data)
-    return data
+async def search_artist(request: Request, user_id: int, q: str, market: Optional[str] = None,
+                        stream: bool = Query(False, description="Stream Spotify's response without caching it")):
+    return await _search_passthrough(request, user_id, q, "artist", market, stream)
 
 
 @router.get("/search/track")
-async def search_track(user_id: int, q: str):
-    data = await SpotifyService.search_tracks_raw(user_id, q)
-    if "error" in data:
-        raise HTTPException(400 if data["error"] != "no_valid_token" else 401, detail=data)
-    return data
+async def search_track(request: Request, user_id: int, q: str, market: Optional[str] = None,
+                       stream: bool = Query(False, description="Stream Spotify's response without caching it")):
+    return await _search_passthrough(request, user_id, q, "track", market, stream)
 
 
 @router.put("/me/following")
@@ -47,14 +107,33 @@ async def follow_artists_or_users(
         if str(e) == "no_valid_token":
             raise HTTPException(401, "User not authenticated with Spotify (Requires new login for scope update)")
         raise HTTPException(400, str(e))
+    except AppError:
+        # rate limits, upstream errors... go to the app's handlers (503 with Retry-After, 502)
+        raise
     except Exception as e:
         raise HTTPException(500, str(e))
 
 
+async def _ndjson_pages(first_page: List[dict], pages: AsyncIterator[List[dict]]) -> AsyncIterator[str]:
+    yield "".join(json.dumps(item) + "\n" for item in first_page)
+    async for page in pages:
+        yield "".join(json.dumps(item) + "\n" for item in page)
+
+
 @router.get("/me/following/artists")
-async def get_followed_artists(user_id: int):
+async def get_followed_artists(
+        request: Request,
+        user_id: int,
+        max_items: Optional[int] = Query(None, ge=1, description="Stop after this many artists")
+):
     try:
-        artists = await SpotifyService.get_my_followed_artists(user_id)
+        if wants_ndjson(request):
+            # fetch the first page up front so auth errors still map to a proper status code
+            pages = SpotifyService.iter_my_followed_artists(user_id, max_items)
+            first_page = await anext(pages, [])
+            return ndjson_response(_ndjson_pages(first_page, pages))
+
+        artists = await SpotifyService.get_my_followed_artists(user_id, max_items)
         return {"count": len(artists), "items": artists}
     except ValueError as e:
         if str(e) == "no_valid_token":
@@ -80,3 +159,23 @@ async def check_following(
         if str(e) == "no_valid_token":
             raise HTTPException(401, "User not authenticated with Spotify")
         raise HTTPException(400, str(e))
+
+
+def _fans_response(kind: str, item_id: str):
+    fans = UserService.get_fans(kind, item_id)
+    return {"id": item_id, "count": len(fans), "fans": [{"id": u.id, "name": u.name} for u in fans]}
+
+
+@router.get("/artists/{artist_id}/fans")
+async def get_artist_fans(artist_id: str):
+    return _fans_response("artist", artist_id)
+
+
+@router.get("/tracks/{track_id}/fans")
+async def get_track_fans(track_id: str):
+    return _fans_response("track", track_id)
+
+
+@router.get("/stats")
+async def spotify_stats():
+    return SpotifyService.get_stats()
@@ -0,0 +1,30 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Query
+from pydantic import TypeAdapter
+
+from app.models import GenreCount, FavoriteCount
+from app.services import StatsService
+from .responses import list_response
+
+router = APIRouter(prefix="/stats", tags=["Stats"])
+
+MAX_TOP = 1000
+
+_GENRE_LIST = TypeAdapter(List[GenreCount])
+_FAVORITE_LIST = TypeAdapter(List[FavoriteCount])
+
+
+@router.get("/genres", response_model=List[GenreCount])
+async def genre_stats(k: Optional[int] = Query(None, ge=1, le=MAX_TOP, description="Only the k most liked genres")):
+    return list_response(_GENRE_LIST, StatsService.top_genres(k))
+
+
+@router.get("/top-artists", response_model=List[FavoriteCount])
+async def top_artists(k: int = Query(10, ge=1, le=MAX_TOP)):
+    return list_response(_FAVORITE_LIST, StatsService.top_favorites("artist", k))
+
+
+@router.get("/top-tracks", response_model=List[FavoriteCount])
+async def top_tracks(k: int = Query(10, ge=1, le=MAX_TOP)):
+    return list_response(_FAVORITE_LIST, StatsService.top_favorites("track", k))
@@ -0,0 +1,14 @@
+from typing import AsyncIterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(chunks: AsyncIterator[str], **kwargs) -> StreamingResponse:
+    return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE, **kwargs)
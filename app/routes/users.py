@@ -1,37 +1,143 @@
-from typing import List
+import json
+from typing import List, Optional, AsyncIterator
 
-from fastapi import APIRouter, status, Request, HTTPException
+from fastapi import APIRouter, status, Request, HTTPException, Query
 from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
 
-from app.models import User, UserCreate, SpotifyArtist, SpotifyTrack
-from app.services import UserService, SpotifyService
+from app import profiling
+from app.errors import AppError, EntityNotFoundError, PreconditionFailedError
+from app.models import User, UserCreate, SimilarUser, SpotifyArtist, SpotifyTrack, FavoritesBatchRequest
+from app.services import UserService, SpotifyService, UserImportService
+from .responses import model_response, list_response, etag_matches, not_modified, \
+    if_match_satisfied
+from .streaming import wants_ndjson, ndjson_response, NDJSON_MEDIA_TYPE
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+_USER_LIST = TypeAdapter(List[User])
+_SIMILAR_LIST = TypeAdapter(List[SimilarUser])
+
+
+async def _ndjson_users(after: Optional[int], limit: Optional[int]) -> AsyncIterator[str]:
+    for page in UserService.iter_user_pages(after, limit):
+        yield "".join(user.model_dump_json() + "\n" for user in page)
+
 
 @router.get("/", response_model=List[User])
-async def list_users():
-    return UserService.list_users()
+async def list_users(
+        request: Request,
+        limit: Optional[int] = Query(None, ge=1, description=f"Page size (default {DEFAULT_PAGE_SIZE}, "
+                                                             f"max {MAX_PAGE_SIZE}; unbounded when streaming)"),
+        after: Optional[int] = Query(None, ge=0, description="Return users with an id greater than this cursor")
+):
+    # JSON and NDJSON share the URL, so every answer says it depends on Accept
+    vary = {"Vary": "Accept"}
+    if wants_ndjson(request):
+        return ndjson_response(_ndjson_users(after, limit), headers=vary)
+
+    # one collection-wide version, so any change to any user invalidates every cached page;
+    # the cursor and page size tell the pages of one version apart
+    page_size = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    etag = UserService.get_collection_etag(f"a{after or 0}", f"l{page_size}")
+    if etag_matches(request, etag):
+        return not_modified(etag, headers=vary)
+
+    users = UserService.list_users(after=after, limit=page_size)
+    headers = {"ETag": etag, **vary}
+    _add_next_page_headers(request, users, page_size, headers)
+    return list_response(_USER_LIST, users, headers=headers)
+
+
+def _add_next_page_headers(request: Request, users: List[User], page_size: int, headers: dict) -> None:
+    if len(users) == page_size:
+        next_cursor = users[-1].id
+        next_url = request.url.include_query_params(after=next_cursor, limit=page_size)
+        headers["X-Next-Cursor"] = str(next_cursor)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+
+@router.get("/search", response_model=List[User])
+async def search_users(
+        request: Request,
+        genre: Optional[List[str]] = Query(None, description="Liked genre, case-insensitive; repeat to require several"),
+        min_age: Optional[int] = Query(None, ge=0),
+        max_age: Optional[int] = Query(None, ge=0),
+        name: Optional[str] = Query(None, min_length=1, description="Case-insensitive prefix of the user's name"),
+        limit: Optional[int] = Query(None, ge=1, description=f"Page size (default {DEFAULT_PAGE_SIZE}, "
+                                                             f"max {MAX_PAGE_SIZE})"),
+        after: Optional[int] = Query(None, ge=0, description="Return users with an id greater than this cursor")
+):
+    if min_age is not None and max_age is not None and min_age > max_age:
+        raise HTTPException(400, "min_age cannot be greater than max_age")
+    if name is not None:
+        name = name.strip()
+        if not name:
+            raise HTTPException(400, "name cannot be blank")
+
+    page_size = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    users = UserService.search_users(genres=genre, min_age=min_age, max_age=max_age, name_prefix=name,
+                                     after=after, limit=page_size)
+    headers = {}
+    _add_next_page_headers(request, users, page_size, headers)
+    return list_response(_USER_LIST, users, headers=headers)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=User)
 async def create_user(user_data: UserCreate):
-    return UserService.create_user(user_data)
+    user = UserService.create_user(user_data)
+    return model_response(user, status_code=status.HTTP_201_CREATED,
+                          headers={"ETag": UserService.get_user_etag(user.id)})
+
+
+@router.post("/bulk")
+async def bulk_create_users(request: Request):
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        return await UserImportService.import_ndjson(request.stream())
+
+    try:
+        rows = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(400, "Body must be a JSON array or NDJSON")
+    if not isinstance(rows, list):
+        raise HTTPException(400, "Body must be a JSON array or NDJSON")
+    return UserImportService.import_rows(rows)
 
 
 @router.get("/{user_id}", response_model=User)
-async def get_user(user_id: int):
-    return UserService.get_user(user_id)
+async def get_user(user_id: int, request: Request):
+    etag = UserService.get_user_etag(user_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return model_response(UserService.get_user(user_id), headers={"ETag": etag})
+
+
+@router.get("/{user_id}/similar", response_model=List[SimilarUser])
+async def get_similar_users(user_id: int, k: int = Query(10, ge=1, le=100)):
+    return list_response(_SIMILAR_LIST, UserService.get_similar_users(user_id, k))
+
+
+def _check_if_match(request: Request, user_id: int) -> None:
+    if not if_match_satisfied(request, UserService.get_user_etag(user_id)):
+        raise PreconditionFailedError(f"User {user_id} has changed since the given ETag")
 
 
 @router.put("/{user_id}", response_model=User)
-async def update_user(user_id: int, user_data: UserCreate):
-    return UserService.update_user(user_id, user_data)
+async def update_user(user_id: int, user_data: UserCreate, request: Request):
+    async with UserService.lock_user(user_id):
+        _check_if_match(request, user_id)
+        user = UserService.update_user(user_id, user_data)
+    return model_response(user, headers={"ETag": UserService.get_user_etag(user_id)})
 
 
 @router.delete("/{user_id}")
-async def delete_user(user_id: int):
-    UserService.delete_user(user_id)
+async def delete_user(user_id: int, request: Request):
+    async with UserService.lock_user(user_id):
+        _check_if_match(request, user_id)
+        UserService.delete_user(user_id)
     return {"message": "User deleted successfully"}
 
 
@@ -60,43 +166,94 @@ async def spotify_callback(request: Request):
 
 @router.post("/{user_id}/favorites/artists", response_model=SpotifyArtist)
 async def add_favorite_artist(user_id: int, artist_name: str):
-    user = UserService.get_user(user_id)
-    if not user: raise HTTPException(404, "User not found")
+    profiling.mark("validate")
+    async with UserService.lock_user(user_id):
+        user = UserService.get_user(user_id)
+        if not user: raise HTTPException(404, "User not found")
 
-    try:
-        artist_obj = await SpotifyService.find_artist_to_save(user_id, artist_name)
-    except ValueError as e:
-        if str(e) == "no_valid_token":
-            raise HTTPException(401, "User not logged in Spotify")
-        raise HTTPException(500, str(e))
-
-    if not artist_obj:
-        raise HTTPException(404, "Artist not found on Spotify")
+        try:
+            artist_obj = await SpotifyService.find_artist_to_save(user_id, artist_name)
+        except ValueError as e:
+            if str(e) == "no_valid_token":
+                raise HTTPException(401, "User not logged in Spotify")
+            raise HTTPException(500, str(e))
 
-    if any(a.id == artist_obj.id for a in user.favorite_artists):
-        return artist_obj
+        if not artist_obj:
+            raise HTTPException(404, "Artist not found on Spotify")
 
-    user.favorite_artists.append(artist_obj)
-    return artist_obj
+        with profiling.span("save"):
+            UserService.add_favorite_artist(user_id, artist_obj)
+    return model_response(artist_obj)
 
 
 @router.post("/{user_id}/favorites/tracks", response_model=SpotifyTrack)
 async def add_favorite_track(user_id: int, track_name: str):
-    user = UserService.get_user(user_id)
-    if not user: raise HTTPException(404, "User not found")
+    profiling.mark("validate")
+    async with UserService.lock_user(user_id):
+        user = UserService.get_user(user_id)
+        if not user: raise HTTPException(404, "User not found")
+
+        try:
+            track_obj = await SpotifyService.find_track_to_save(user_id, track_name)
+        except ValueError as e:
+            if str(e) == "no_valid_token":
+                raise HTTPException(401, "User not logged in Spotify")
+            raise HTTPException(500, str(e))
+
+        if not track_obj:
+            raise HTTPException(404, "Track not found on Spotify")
+
+        with profiling.span("save"):
+            UserService.add_favorite_track(user_id, track_obj)
+    return model_response(track_obj)
+
+
+def _batch_results(user_id: int, queries: List[str], results: List, add_favorite) -> List[dict]:
+    items = []
+    for query, result in zip(queries, results):
+        if isinstance(result, EntityNotFoundError):
+            items.append({"query": query, "status": "not_found", "item": None, "message": result.message})
+        elif isinstance(result, Exception):
+            message = result.message if isinstance(result, AppError) else str(result)
+            items.append({"query": query, "status": "error", "item": None, "message": message})
+        else:
+            added = add_favorite(user_id, result)
+            items.append({"query": query, "status": "added" if added else "already_saved",
+                          "item": result.model_dump(), "message": None})
+    return items
+
+
+@router.post("/{user_id}/favorites/artists:batch")
+async def add_favorite_artists_batch(user_id: int, batch: FavoritesBatchRequest):
+    profiling.mark("validate")
+    async with UserService.lock_user(user_id):
+        UserService.get_user(user_id)
+        results = await SpotifyService.find_artists_to_save(user_id, batch.names)
+        with profiling.span("save"):
+            items = _batch_results(user_id, batch.names, results, UserService.add_favorite_artist)
+    return {"items": items}
+
+
+@router.post("/{user_id}/favorites/tracks:batch")
+async def add_favorite_tracks_batch(user_id: int, batch: FavoritesBatchRequest):
+    profiling.mark("validate")
+    async with UserService.lock_user(user_id):
+        UserService.get_user(user_id)
+        results = await SpotifyService.find_tracks_to_save(user_id, batch.names)
+        with profiling.span("save"):
+            items = _batch_results(user_id, batch.names, results, UserService.add_favorite_track)
+    return {"items": items}
 
-    try:
-        track_obj = await SpotifyService.find_track_to_save(user_id, track_name)
-    except ValueError as e:
-        if str(e) == "no_valid_token":
-            raise HTTPException(401, "User not logged in Spotify")
-        raise HTTPException(500, str(e))
 
-    if not track_obj:
-        raise HTTPException(404, "Track not found on Spotify")
+@router.delete("/{user_id}/favorites/artists/{artist_id}")
+async def remove_favorite_artist(user_id: int, artist_id: str):
+    async with UserService.lock_user(user_id):
+        UserService.remove_favorite_artist(user_id, artist_id)
+    return {"message": "Favorite artist removed successfully"}
 
-    if any(t.id == track_obj.id for t in user.favorite_tracks):
-        return track_obj
 
-    user.favorite_tracks.append(track_obj)
-    return track_obj
+@router.delete("/{user_id}/favorites/tracks/{track_id}")
+async def remove_favorite_track(user_id: int, track_id: str):
+    async with UserService.lock_user(user_id):
+        UserService.remove_favorite_track(user_id, track_id)
+    return {"message": "Favorite track removed successfully"}
@@ -1,2 +1,5 @@
 from .spotify_service import SpotifyService
 from .user_service import UserService
+from .user_import_service import UserImportService
+from .enrichment_service import EnrichmentService
+from .stats_service import StatsService
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.errors import AppError
+from app.models import User, SpotifyArtist, SpotifyTrack
+from app import spotify
+from app.settings import get_settings
+from .user_service import UserService
+
+logger = logging.getLogger(__name__)
+
+SPOTIFY_IDS_PER_REQUEST = 50
+
+_task: Optional[asyncio.Task] = None
+
+
+class EnrichmentService:
+    _enriched_at: Dict[Tuple[str, str], float] = {}
+
+    @staticmethod
+    def _collect() -> Tuple[Dict[str, List[Tuple[User, SpotifyArtist]]], Dict[str, List[Tuple[User, SpotifyTrack]]]]:
+        # every stored copy of each artist/track, so one fetched entity updates all of them
+        artists = defaultdict(list)
+        tracks = defaultdict(list)
+        for page in UserService.iter_user_pages():
+            for user in page:
+                for artist in user.favorite_artists:
+                    artists[artist.id].append((user, artist))
+                for track in user.favorite_tracks:
+                    tracks[track.id].append((user, track))
+                    for artist in track.artists:
+                        artists[artist.id].append((user, artist))
+        return artists, tracks
+
+    @staticmethod
+    def _prune(artists, tracks) -> None:
+        # forget items nobody has as a favorite anymore, or the timestamps grow without bound
+        collected = {"artist": artists, "track": tracks}
+        EnrichmentService._enriched_at = {
+            key: at for key, at in EnrichmentService._enriched_at.items() if key[1] in collected[key[0]]
+        }
+
+    @staticmethod
+    def _due(kind: str, ids, max_age: float, now: float) -> List[str]:
+        return [i for i in ids if now - EnrichmentService._enriched_at.get((kind, i), 0.0) >= max_age]
+
+    @staticmethod
+    async def _fetch(fetch, access_token: str, ids: List[str], concurrency: int) -> List[Dict[str, Any]]:
+        chunks = await spotify.client.map_chunks(
+            ids, SPOTIFY_IDS_PER_REQUEST, lambda chunk: fetch(access_token, chunk), concurrency
+        )
+        return [entity for chunk in chunks for entity in chunk if entity]
+
+    @staticmethod
+    async def run_once() -> Dict[str, int]:
+        settings = get_settings()
+        now = time.time()
+        artists, tracks = EnrichmentService._collect()
+        EnrichmentService._prune(artists, tracks)
+        artist_ids = EnrichmentService._due("artist", artists, settings.enrichment_max_age, now)
+        track_ids = EnrichmentService._due("track", tracks, settings.enrichment_max_age, now)
+        if not artist_ids and not track_ids:
+            return {"artists": 0, "tracks": 0, "users": 0}
+
+        access_token = await spotify.tokens.ensure_app_token()
+        if not access_token:
+            logger.warning("Skipping metadata enrichment: could not get an app token from Spotify")
+            return {"artists": 0, "tracks": 0, "users": 0}
+
+        concurrency = settings.spotify_batch_concurrency
+        fetched_artists, fetched_tracks = await asyncio.gather(
+            EnrichmentService._fetch(spotify.client.get_several_artists, access_token, artist_ids, concurrency),
+            EnrichmentService._fetch(spotify.client.get_several_tracks, access_token, track_ids, concurrency)
+        )
+
+        touched: Dict[int, User] = {}
+        for data in fetched_artists:
+            for user, artist in artists.get(data["id"], []):
+                artist.popularity = data.get("popularity")
+                artist.genres = data.get("genres", [])
+                touched[user.id] = user
+            EnrichmentService._enriched_at[("artist", data["id"])] = now
+        for data in fetched_tracks:
+            for user, track in tracks.get(data["id"], []):
+                track.popularity = data.get("popularity")
+                touched[user.id] = user
+            EnrichmentService._enriched_at[("track", data["id"])] = now
+
+        for user in touched.values():
+            UserService.save_changes(user)
+        return {"artists": len(fetched_artists), "tracks": len(fetched_tracks), "users": len(touched)}
+
+    @staticmethod
+    def reset() -> None:
+        EnrichmentService._enriched_at.clear()
+
+
+async def run_enrichment(interval_seconds: float) -> None:
+    while True:
+        try:
+            summary = await EnrichmentService.run_once()
+            if summary["users"]:
+                logger.info(f"Enriched {summary['artists']} artists and {summary['tracks']} tracks "
+                            f"for {summary['users']} users")
+        except AppError as e:
+            logger.warning(f"Metadata enrichment failed: {e.message}")
+        except Exception:
+            logger.exception("Metadata enrichment failed")
+        await asyncio.sleep(interval_seconds)
+
+
+async def startup() -> None:
+    global _task
+    interval = get_settings().enrichment_interval
+    if interval <= 0 or _task is not None:
+        return
+    _task = asyncio.create_task(run_enrichment(interval))
+
+
+async def shutdown() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
@@ -1,19 +1,23 @@
-from typing import Dict, Any, List
+import asyncio
+from typing import Dict, Any, List, Optional, Union, AsyncIterator
 
-from app.database.memory import token_store
+from pydantic import ValidationError
+
+from app import profiling, spotify
+from app.database import token_store
 from app.errors import AuthenticationError, ExternalAPIError, EntityNotFoundError
 from app.models import SpotifyArtist, SpotifyTrack
-from app.spotify import auth, client
+from app.settings import get_settings
 
 
 class SpotifyService:
     @staticmethod
     def get_login_url(user_id: int) -> str:
-        return auth.build_authorize_url(user_id)
+        return spotify.auth.build_authorize_url(user_id)
 
     @staticmethod
     async def process_auth_callback(code: str, user_id: int) -> bool:
-        token = await auth.exchange_code_for_token(code)
+        token = await spotify.auth.exchange_code_for_token(code)
         if not token:
             return False
         token_store[user_id] = token
@@ -34,85 +38,129 @@ class SpotifyService:
         return data
 
     @staticmethod
-    async def find_artist_to_save(user_id: int, query: str) -> SpotifyArtist:
-        data = await client.search_artist(user_id, query, limit=1)
-        SpotifyService._handle_client_response(data, "Search Artist")
+    async def _access_token_or_raise(user_id: int) -> str:
+        token = await spotify.tokens.ensure_valid_token(user_id)
+        if not token:
+            raise AuthenticationError("User session with Spotify expired or invalid. Please login again.")
+        return token
+
+    @staticmethod
+    async def _resolve_many(user_id: int, queries: List[str], type_: str, parse) -> List[Any]:
+        token = await SpotifyService._access_token_or_raise(user_id)
+        semaphore = asyncio.Semaphore(get_settings().spotify_batch_concurrency)
+
+        async def resolve(query: str):
+            async with semaphore:
+                body = await spotify.client.search_raw_with_token(token, query, type_, limit=1)
+                return parse(body, query)
+
+        return await asyncio.gather(*(resolve(query) for query in queries), return_exceptions=True)
 
-        items = data.get("artists", {}).get("items", [])
+    @staticmethod
+    def _decode_first(body: Union[bytes, Dict[str, Any]], decode, context: str, entity: str, query: str):
+        if isinstance(body, dict):
+            SpotifyService._handle_client_response(body, context)
+        try:
+            with profiling.span("decode"):
+                items = decode(body)
+        except ValidationError as e:
+            raise ExternalAPIError("Spotify", f"{context}: unexpected response ({e.error_count()} errors)")
         if not items:
-            raise EntityNotFoundError("SpotifyArtist", query)
+            raise EntityNotFoundError(entity, query)
+        return items[0]
+
+    @staticmethod
+    async def find_artist_to_save(user_id: int, query: str) -> SpotifyArtist:
+        body = await spotify.client.search_raw(user_id, query, "artist", limit=1)
+        return SpotifyService._parse_artist_result(body, query)
 
-        raw = items[0]
-        return SpotifyArtist(
-            id=raw["id"],
-            name=raw["name"],
-            popularity=raw.get("popularity"),
-            genres=raw.get("genres", []),
-            href=raw["href"],
-            uri=raw["uri"]
-        )
+    @staticmethod
+    async def find_artists_to_save(user_id: int, queries: List[str]) -> List[Union[SpotifyArtist, Exception]]:
+        return await SpotifyService._resolve_many(user_id, queries, "artist", SpotifyService._parse_artist_result)
+
+    @staticmethod
+    def _parse_artist_result(body: Union[bytes, Dict[str, Any]], query: str) -> SpotifyArtist:
+        return SpotifyService._decode_first(body, spotify.payloads.decode_artists, "Search Artist", "SpotifyArtist",
+                                            query)
 
     @staticmethod
     async def find_track_to_save(user_id: int, query: str) -> SpotifyTrack:
-        data = await client.search_track(user_id, query, limit=1)
-        SpotifyService._handle_client_response(data, "Search Track")
+        body = await spotify.client.search_raw(user_id, query, "track", limit=1)
+        return SpotifyService._parse_track_result(body, query)
 
-        items = data.get("tracks", {}).get("items", [])
-        if not items:
-            raise EntityNotFoundError("SpotifyTrack", query)
+    @staticmethod
+    async def find_tracks_to_save(user_id: int, queries: List[str]) -> List[Union[SpotifyTrack, Exception]]:
+        return await SpotifyService._resolve_many(user_id, queries, "track", SpotifyService._parse_track_result)
 
-        raw = items[0]
-        artists_list = [
-            SpotifyArtist(id=a["id"], name=a["name"], href=a["href"], uri=a["uri"])
-            for a in raw["artists"]
-        ]
+    @staticmethod
+    def _parse_track_result(body: Union[bytes, Dict[str, Any]], query: str) -> SpotifyTrack:
+        return SpotifyService._decode_first(body, spotify.payloads.decode_tracks, "Search Track", "SpotifyTrack",
+                                            query)
 
-        return SpotifyTrack(
-            id=raw["id"],
-            name=raw["name"],
-            popularity=raw.get("popularity"),
-            duration_ms=raw["duration_ms"],
-            explicit=raw["explicit"],
-            artists=artists_list,
-            album_name=raw["album"]["name"],
-            href=raw["href"],
-            uri=raw["uri"]
-        )
+    @staticmethod
+    async def search_artists_raw(user_id: int, q: str, market: Optional[str] = None) -> Union[bytes, Dict[str, Any]]:
+        return await spotify.client.search_raw(user_id, q, "artist", limit=10, market=market)
 
     @staticmethod
-    async def search_artists_raw(user_id: int, q: str):
-        return await client.search_artist(user_id, q, limit=10)
+    async def search_tracks_raw(user_id: int, q: str, market: Optional[str] = None) -> Union[bytes, Dict[str, Any]]:
+        return await spotify.client.search_raw(user_id, q, "track", limit=10, market=market)
 
     @staticmethod
-    async def search_tracks_raw(user_id: int, q: str):
-        return await client.search_track(user_id, q, limit=10)
+    async def open_search_stream(user_id: int, q: str, type_: str, market: Optional[str] = None):
+        return await spotify.client.open_search_stream(user_id, q, type_, limit=10, market=market)
+
+    @staticmethod
+    def search_cache_max_age() -> int:
+        return int(spotify.client.get_search_cache().ttl)
 
     @staticmethod
     async def follow_targets(user_id: int, ids: List[str], target_type: str) -> bool:
         if target_type not in ["artist", "user"]:
             raise ValueError("Type must be 'artist' or 'user'")
 
-        result = await client.follow_ids(user_id, ids, target_type)
+        result = await spotify.client.follow_ids(user_id, ids, target_type)
         if "error" in result:
-            if result["error"] == "no_valid_token":
+            if result["error"] in ("no_valid_token", "token_expired_or_invalid"):
                 raise ValueError("no_valid_token")
             raise Exception(result["error"])
         return True
 
     @staticmethod
-    async def get_my_followed_artists(user_id: int) -> List[Dict[str, Any]]:
-        data = await client.get_followed_artists(user_id)
+    async def iter_my_followed_artists(user_id: int, max_items: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        after = None
+        remaining = max_items
+        while remaining is None or remaining > 0:
+            limit = spotify.client.FOLLOWED_ARTISTS_PAGE_SIZE if remaining is None \
+                else min(spotify.client.FOLLOWED_ARTISTS_PAGE_SIZE, remaining)
+            data = await spotify.client.get_followed_artists(user_id, limit=limit, after=after)
+
+            if "error" in data:
+                if data["error"] == "no_valid_token":
+                    raise ValueError("no_valid_token")
+                raise Exception(data.get("message", "Error getting followed artists"))
+
+            page = data.get("artists", {})
+            items = page.get("items", [])
+            if not items:
+                return
+            yield items
+
+            if remaining is not None:
+                remaining -= len(items)
+            after = page.get("cursors", {}).get("after")
+            if not after:
+                return
 
-        if "error" in data:
-            if data["error"] == "no_valid_token":
-                raise ValueError("no_valid_token")
-            raise Exception(data.get("message", "Error getting followed artists"))
-
-        return data.get("artists", {}).get("items", [])
+    @staticmethod
+    async def get_my_followed_artists(user_id: int, max_items: Optional[int] = None) -> List[Dict[str, Any]]:
+        artists = []
+        async for page in SpotifyService.iter_my_followed_artists(user_id, max_items):
+            artists.extend(page)
+        return artists
 
     @staticmethod
-    async def check_if_following(user_id: int, ids: List[str], target_type: str) -> dict[str, Any]:
-        data = await client.check_following_status(user_id, ids, target_type)
+    async def check_if_following(user_id: int, ids: List[str], target_type: str) -> List[bool]:
+        data = await spotify.client.check_following_status(user_id, ids, target_type)
 
         if isinstance(data, dict) and "error" in data:
             if data["error"] == "no_valid_token":
@@ -120,3 +168,13 @@ class SpotifyService:
             raise Exception(data.get("message", "Error checking following status"))
 
         return data
+
+    @staticmethod
+    def get_stats() -> Dict[str, Any]:
+        return {
+            "pool": spotify.pool.stats(),
+            "search_cache": spotify.client.get_search_cache().stats(),
+            "follow_cache": spotify.client.get_follow_cache().stats(),
+            "coalescing": spotify.client.coalescing_stats(),
+            "scheduler": spotify.scheduler.get_scheduler().stats()
+        }
@@ -0,0 +1,16 @@
+from typing import List, Optional
+
+from app.indexes import popularity_index
+from app.models import GenreCount, FavoriteCount
+
+
+class StatsService:
+    @staticmethod
+    def top_genres(k: Optional[int] = None) -> List[GenreCount]:
+        return [GenreCount(genre=popularity_index.label("genre", key), users=count)
+                for key, count in popularity_index.genres.top(k)]
+
+    @staticmethod
+    def top_favorites(kind: str, k: int) -> List[FavoriteCount]:
+        return [FavoriteCount(id=item_id, name=popularity_index.label(kind, item_id), favorites=count)
+                for item_id, count in popularity_index.favorites[kind].top(k)]
@@ -0,0 +1,93 @@
+from typing import Any, AsyncIterator, Dict, List
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.models import UserCreate
+from .user_service import UserService
+
+BATCH_SIZE = 1000
+
+_USER_CREATE = TypeAdapter(UserCreate)
+_USER_CREATE_BATCH = TypeAdapter(List[UserCreate])
+
+
+def _format_errors(exc: ValidationError) -> List[str]:
+    messages = []
+    for error in exc.errors():
+        field = ".".join(str(x) for x in error["loc"])
+        messages.append(f"{field}: {error['msg']}" if field else error["msg"])
+    return messages
+
+
+class UserImportService:
+
+    @staticmethod
+    def _validate_batch(first_index: int, rows: List[Any], from_json: bool,
+                        errors: List[Dict[str, Any]]) -> List[UserCreate]:
+        # NDJSON lines are validated one by one: splicing them into a single JSON array would let a
+        # malformed line merge with its neighbours and turn into a different number of users
+        if not from_json:
+            try:
+                return _USER_CREATE_BATCH.validate_python(rows)
+            except ValidationError:
+                pass
+
+        # row by row, so the good rows still get in when some are invalid
+        validate_one = _USER_CREATE.validate_json if from_json else _USER_CREATE.validate_python
+        valid = []
+        for offset, row in enumerate(rows):
+            try:
+                valid.append(validate_one(row))
+            except ValidationError as e:
+                errors.append({"index": first_index + offset, "errors": _format_errors(e)})
+        return valid
+
+    @staticmethod
+    def _insert(valid: List[UserCreate], errors: List[Dict[str, Any]], total: int) -> Dict[str, Any]:
+        users = UserService.create_users(valid)
+        errors.sort(key=lambda e: e["index"])
+        return {
+            "received": total,
+            "created": len(users),
+            "failed": len(errors),
+            "ids": [user.id for user in users],
+            "errors": errors
+        }
+
+    @staticmethod
+    def import_rows(rows: List[Any]) -> Dict[str, Any]:
+        valid: List[UserCreate] = []
+        errors: List[Dict[str, Any]] = []
+        for start in range(0, len(rows), BATCH_SIZE):
+            valid.extend(UserImportService._validate_batch(start, rows[start:start + BATCH_SIZE], False, errors))
+        return UserImportService._insert(valid, errors, len(rows))
+
+    @staticmethod
+    async def import_ndjson(chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        valid: List[UserCreate] = []
+        errors: List[Dict[str, Any]] = []
+        batch: List[bytes] = []
+        batch_start = 0
+        total = 0
+        pending = b""
+
+        def take_lines(data: bytes) -> List[bytes]:
+            return [line.strip() for line in data.split(b"\n") if line.strip()]
+
+        async for chunk in chunks:
+            pending += chunk
+            complete, _, pending = pending.rpartition(b"\n")
+            for line in take_lines(complete):
+                batch.append(line)
+                total += 1
+                if len(batch) == BATCH_SIZE:
+                    valid.extend(UserImportService._validate_batch(batch_start, batch, True, errors))
+                    batch_start, batch = total, []
+
+        for line in take_lines(pending):
+            batch.append(line)
+            total += 1
+        if batch:
+            valid.extend(UserImportService._validate_batch(batch_start, batch, True, errors))
+
+        return UserImportService._insert(valid, errors, total)
@@ -1,25 +1,138 @@
-from typing import List
+import asyncio
+import heapq
+import sys
+from typing import List, Iterator, Optional
 
-from app.database.memory import fake_db
-from app.errors import EntityNotFoundError
-from app.models import User, UserCreate
+from app.database import user_repository
+from app.errors import EntityNotFoundError, ServiceUnavailableError
+from app.locks import KeyedLock
+from app.indexes import user_indexes, favorites_index, favorites_of, version_index, genre_index, age_index, \
+    name_index, similarity_index, Condition, matching_ids
+from app.models import User, UserCreate, SimilarUser, SpotifyArtist, SpotifyTrack
+
+# stores up to this size get their similarity index built in place (~0.1 ms per user); larger ones
+# build it in a worker thread and answer 503 until it is ready
+SIMILARITY_INLINE_BUILD_LIMIT = 500
 
 
 class UserService:
+    # Writes that await in between (a Spotify lookup before saving a favorite) hold their user's
+    # lock, so same-user writes apply one at a time while other users' writes run in parallel.
+    user_locks = KeyedLock()
+    _similarity_build: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def lock_user(user_id: int):
+        return UserService.user_locks.hold(user_id)
+
+    @staticmethod
+    def list_users(after: Optional[int] = None, limit: int = 100) -> List[User]:
+        return user_repository.list_page(after or 0, limit)
+
+    @staticmethod
+    def iter_user_pages(after: Optional[int] = None, limit: Optional[int] = None,
+                        page_size: int = 500) -> Iterator[List[User]]:
+        cursor = after or 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            page = user_repository.list_page(cursor, size)
+            if not page:
+                return
+            yield page
+            cursor = page[-1].id
+            if remaining is not None:
+                remaining -= len(page)
+
+    @staticmethod
+    def search_users(genres: Optional[List[str]] = None, min_age: Optional[int] = None,
+                     max_age: Optional[int] = None, name_prefix: Optional[str] = None,
+                     after: Optional[int] = None, limit: int = 100) -> List[User]:
+        conditions = [
+            Condition(len(genre_index.users_with(genre)), lambda genre=genre: genre_index.users_with(genre),
+                      lambda user_id, genre=genre: genre_index.likes(user_id, genre))
+            for genre in genres or []
+        ]
+        if min_age is not None or max_age is not None:
+            low, high = min_age or 0, sys.maxsize if max_age is None else max_age
+            conditions.append(Condition(age_index.count_between(low, high),
+                                        lambda: age_index.users_between(low, high),
+                                        lambda user_id: age_index.is_between(user_id, low, high)))
+        if name_prefix:
+            conditions.append(Condition(name_index.count_with_prefix(name_prefix),
+                                        lambda: name_index.users_with_prefix(name_prefix),
+                                        lambda user_id: name_index.has_prefix(user_id, name_prefix)))
+        if not conditions:
+            return UserService.list_users(after=after, limit=limit)
+
+        cursor = after or 0
+        page = heapq.nsmallest(limit, (user_id for user_id in matching_ids(conditions) if user_id > cursor))
+        return [user_repository.get(user_id) for user_id in page]
+
     @staticmethod
-    def list_users() -> List[User]:
-        return fake_db
+    def get_similar_users(user_id: int, k: int = 10) -> List[SimilarUser]:
+        UserService._find_user_or_raise(user_id)
+        if not similarity_index.built:
+            if len(user_repository) <= SIMILARITY_INLINE_BUILD_LIMIT:
+                similarity_index.ensure_built(user_repository)
+            else:
+                UserService.start_similarity_build()
+                raise ServiceUnavailableError("Similar users index is still being built, please retry later",
+                                              retry_after=max(1.0, len(user_repository) / 10_000))
+        return [SimilarUser.model_construct(user=user_repository.get(other_id), similarity=round(score, 4))
+                for other_id, score in similarity_index.similar(user_id, k)]
+
+    @staticmethod
+    def start_similarity_build() -> None:
+        if similarity_index.built or similarity_index.building:
+            return
+        users = list(user_repository)
+        generation = similarity_index.begin_build()
+
+        async def build():
+            tables = await asyncio.to_thread(similarity_index.compute, users)
+            similarity_index.finish_build(generation, tables, user_repository.get)
+
+        UserService._similarity_build = asyncio.create_task(build())
+
+    @staticmethod
+    async def stop_similarity_build() -> None:
+        task, UserService._similarity_build = UserService._similarity_build, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
 
     @staticmethod
     def create_user(user_create: UserCreate) -> User:
-        new_id = len(fake_db) + 1
-        user = User(id=new_id, **user_create.model_dump())
-        fake_db.append(user)
+        # user_create is already validated, so skip a second validation pass on User
+        user = User.model_construct(
+            id=user_repository.next_id(), favorite_artists=[], favorite_tracks=[], **user_create.model_dump()
+        )
+        user_repository.add(user)
+        for index in user_indexes:
+            index.add_user(user)
         return user
 
+    @staticmethod
+    def create_users(users_create: List[UserCreate]) -> List[User]:
+        # no awaits in here, so the whole batch is inserted without other requests interleaving
+        return [UserService.create_user(user_create) for user_create in users_create]
+
+    @staticmethod
+    def rebuild_indexes() -> None:
+        for index in user_indexes:
+            index.clear()
+        for user in user_repository.list():
+            for index in user_indexes:
+                index.add_user(user)
+
     @staticmethod
     def _find_user_or_raise(user_id: int) -> User:
-        user = next((u for u in fake_db if u.id == user_id), None)
+        user = user_repository.get(user_id)
         if not user:
             raise EntityNotFoundError(entity="User", identifier=str(user_id))
         return user
@@ -28,17 +141,86 @@ class UserService:
     def get_user(user_id: int) -> User:
         return UserService._find_user_or_raise(user_id)
 
+    @staticmethod
+    def get_user_etag(user_id: int) -> str:
+        etag = version_index.etag(user_id)
+        if etag is None:
+            raise EntityNotFoundError(entity="User", identifier=str(user_id))
+        return etag
+
+    @staticmethod
+    def get_collection_etag(*variant) -> str:
+        return version_index.collection_etag(*variant)
+
     @staticmethod
     def update_user(user_id: int, user_create: UserCreate) -> User:
         user = UserService._find_user_or_raise(user_id)
+        before = user.model_copy()
 
         user.name = user_create.name
         user.age = user_create.age
         user.music_preferences = user_create.music_preferences
 
+        user_repository.update(user)
+        for index in user_indexes:
+            index.update_user(before, user)
         return user
 
+    @staticmethod
+    def save_changes(user: User) -> None:
+        # for in-place edits made outside this service; a user deleted meanwhile stays deleted
+        if user_repository.get(user.id) is user:
+            user_repository.update(user)
+            version_index.touch(user.id)
+
     @staticmethod
     def delete_user(user_id: int) -> None:
+        user = user_repository.delete(user_id)
+        if user is None:
+            raise EntityNotFoundError(entity="User", identifier=str(user_id))
+        for index in user_indexes:
+            index.remove_user(user)
+
+    @staticmethod
+    def _add_favorite(user_id: int, kind: str, item) -> bool:
+        user = UserService._find_user_or_raise(user_id)
+        if favorites_index.has_favorite(user_id, kind, item.id):
+            return False
+        favorites_of(user, kind).append(item)
+        user_repository.update(user)
+        for index in user_indexes:
+            index.add_favorite(user, kind, item)
+        return True
+
+    @staticmethod
+    def _remove_favorite(user_id: int, kind: str, item_id: str) -> None:
         user = UserService._find_user_or_raise(user_id)
-        fake_db.remove(user)
+        if not favorites_index.has_favorite(user_id, kind, item_id):
+            raise EntityNotFoundError(entity=f"Favorite {kind}", identifier=item_id)
+        favorites = favorites_of(user, kind)
+        position = next(i for i, item in enumerate(favorites) if item.id == item_id)
+        item = favorites.pop(position)
+        user_repository.update(user)
+        for index in user_indexes:
+            index.remove_favorite(user, kind, item)
+
+    @staticmethod
+    def add_favorite_artist(user_id: int, artist: SpotifyArtist) -> bool:
+        return UserService._add_favorite(user_id, "artist", artist)
+
+    @staticmethod
+    def add_favorite_track(user_id: int, track: SpotifyTrack) -> bool:
+        return UserService._add_favorite(user_id, "track", track)
+
+    @staticmethod
+    def remove_favorite_artist(user_id: int, artist_id: str) -> None:
+        UserService._remove_favorite(user_id, "artist", artist_id)
+
+    @staticmethod
+    def remove_favorite_track(user_id: int, track_id: str) -> None:
+        UserService._remove_favorite(user_id, "track", track_id)
+
+    @staticmethod
+    def get_fans(kind: str, item_id: str) -> List[User]:
+        users = (user_repository.get(user_id) for user_id in sorted(favorites_index.fans(kind, item_id)))
+        return [user for user in users if user is not None]
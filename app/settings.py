@@ -1,15 +1,59 @@
 from functools import lru_cache
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
-    spotify_client_id: str
-    spotify_client_secret: str
-    spotify_redirect_uri: str
+    # optional so the app (and its tests and tools) can start without Spotify; the Spotify
+    # features fail on use instead
+    spotify_client_id: Optional[str] = None
+    spotify_client_secret: Optional[str] = None
+    spotify_redirect_uri: Optional[str] = None
     environment: str = "development"
     log_level: str = "INFO"
 
+    storage_backend: Literal["memory", "sqlite"] = "memory"
+    sqlite_path: str = "app.db"
+    sqlite_batch_size: int = 500
+
+    spotify_api_base: str = "https://api.spotify.com/v1"
+    spotify_accounts_base: str = "https://accounts.spotify.com"
+    spotify_http_timeout: float = 10.0
+    spotify_http_max_connections: int = 100
+    spotify_http_max_keepalive_connections: int = 20
+    spotify_http_keepalive_expiry: float = 30.0
+    spotify_http2: bool = False
+
+    spotify_token_refresh_interval: float = 60.0
+    spotify_token_refresh_margin: int = 300
+    spotify_token_refresh_concurrency: int = 10
+
+    spotify_search_cache_size: int = 2048
+    spotify_search_cache_ttl: float = 300.0
+    spotify_follow_cache_size: int = 10000
+    spotify_follow_cache_ttl: float = 60.0
+
+    spotify_rate_limit_per_second: float = 20.0
+    spotify_rate_limit_burst: int = 40
+    spotify_max_concurrency: int = 32
+    spotify_max_retries: int = 3
+    spotify_retry_backoff_base: float = 0.5
+    spotify_retry_backoff_max: float = 8.0
+    spotify_max_retry_after: float = 30.0
+    spotify_batch_concurrency: int = 8
+
+    enrichment_interval: float = 300.0
+    enrichment_max_age: float = 86400.0
+
+    profiling_sample_rate: float = 0.0
+    profiling_header_enabled: bool = False
+    profiling_dump_dir: Optional[str] = None
+
+    @property
+    def spotify_configured(self) -> bool:
+        return bool(self.spotify_client_id and self.spotify_client_secret)
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -1,2 +1,16 @@
-from . import auth
-from . import client
+import importlib
+import sys
+
+# Submodules load on first attribute access (spotify.client, spotify.tokens, ...), so importing
+# the app doesn't pull in httpx and the Spotify client until something actually uses them.
+_SUBMODULES = {"auth", "cache", "client", "payloads", "pool", "scheduler", "singleflight", "tokens"}
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def is_loaded(name: str) -> bool:
+    return f"{__name__}.{name}" in sys.modules
@@ -1,19 +1,29 @@
 import base64
+import logging
 import urllib.parse
 from typing import Optional
 
-import httpx
-
+from app.errors import ExternalAPIError
 from app.models import SpotifyToken
-from app.settings import get_settings
+from app.settings import get_settings, Settings
+from app.spotify import pool
+
+logger = logging.getLogger(__name__)
+
 
-settings = get_settings()
+def _configured_settings() -> Settings:
+    settings = get_settings()
+    if not settings.spotify_configured:
+        raise ExternalAPIError("Spotify", "Spotify client credentials are not configured")
+    return settings
 
-AUTH_URL = "https://accounts.spotify.com/authorize"
-TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+def _token_url() -> str:
+    return f"{get_settings().spotify_accounts_base}/api/token"
 
 
 def build_authorize_url(local_user_id: int) -> str:
+    settings = _configured_settings()
     params = {
         "client_id": settings.spotify_client_id,
         "response_type": "code",
@@ -21,10 +31,11 @@ def build_authorize_url(local_user_id: int) -> str:
         "state": str(local_user_id),
         "scope": "user-read-private user-read-email user-follow-read user-follow-modify"
     }
-    return f"{AUTH_URL}?{urllib.parse.urlencode(params)}"
+    return f"{settings.spotify_accounts_base}/authorize?{urllib.parse.urlencode(params)}"
 
 
 def _get_auth_header():
+    settings = _configured_settings()
     auth_str = f"{settings.spotify_client_id}:{settings.spotify_client_secret}"
     b64_auth = base64.b64encode(auth_str.encode()).decode()
     return {
@@ -34,35 +45,49 @@ def _get_auth_header():
 
 
 async def exchange_code_for_token(code: str) -> Optional[SpotifyToken]:
-    async with httpx.AsyncClient() as client:
-        data = {
-            "grant_type": "authorization_code",
-            "code": code,
-            "redirect_uri": settings.spotify_redirect_uri
-        }
-        try:
-            resp = await client.post(TOKEN_URL, data=data, headers=_get_auth_header())
-            if resp.status_code != 200:
-                print(f"Auth Error: {resp.text}")
-                return None
-            return SpotifyToken(**resp.json())
-        except Exception as e:
-            print(f"Exception during token exchange: {e}")
+    client = pool.get_client()
+    headers = _get_auth_header()
+    data = {
+        "grant_type": "authorization_code",
+        "code": code,
+        "redirect_uri": get_settings().spotify_redirect_uri
+    }
+    try:
+        resp = await client.post(_token_url(), data=data, headers=headers)
+        if resp.status_code != 200:
+            logger.warning(f"Authorization code exchange failed: HTTP {resp.status_code}")
             return None
+        return SpotifyToken(**resp.json())
+    except Exception as e:
+        # the type only: validation errors would echo the token payload
+        logger.warning(f"Authorization code exchange failed: {type(e).__name__}")
+        return None
 
 
 async def refresh_token_with_refresh_token(refresh_token: str) -> Optional[SpotifyToken]:
-    async with httpx.AsyncClient() as client:
-        data = {
-            "grant_type": "refresh_token",
-            "refresh_token": refresh_token
-        }
-        resp = await client.post(TOKEN_URL, data=data, headers=_get_auth_header())
-        if resp.status_code != 200:
-            return None
+    client = pool.get_client()
+    data = {
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token
+    }
+    resp = await client.post(_token_url(), data=data, headers=_get_auth_header())
+    if resp.status_code != 200:
+        return None
+
+    token_data = resp.json()
+    if "refresh_token" not in token_data:
+        token_data["refresh_token"] = refresh_token
+
+    return SpotifyToken(**token_data)
+
 
-        token_data = resp.json()
-        if "refresh_token" not in token_data:
-            token_data["refresh_token"] = refresh_token
+async def request_client_credentials_token() -> Optional[SpotifyToken]:
+    client = pool.get_client()
+    resp = await client.post(_token_url(), data={"grant_type": "client_credentials"}, headers=_get_auth_header())
+    if resp.status_code != 200:
+        logger.warning(f"Client credentials token request failed: HTTP {resp.status_code}")
+        return None
 
-        return SpotifyToken(**token_data)
+    token_data = resp.json()
+    token_data.setdefault("scope", "")
+    return SpotifyToken(**token_data)
@@ -1,98 +1,285 @@
+import asyncio
+import json
+import logging
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Union
+
 import httpx
-from app.database import token_store
-from app.spotify.auth import refresh_token_with_refresh_token
-from typing import Optional, Dict, Any, List
 
-API_BASE = "https://api.spotify.com/v1"
+from app import metrics, profiling
+from app.errors import AppError, ExternalAPIError, UpstreamRateLimitError
+from app.settings import get_settings
+from app.spotify import pool
+from app.spotify.cache import TTLCache
+from app.spotify.scheduler import get_scheduler, parse_retry_after
+from app.spotify.singleflight import SingleFlight
+from app.spotify.tokens import ensure_valid_token
 
+logger = logging.getLogger(__name__)
 
-async def _ensure_valid_token_for_user(local_user_id: int) -> Optional[str]:
-    token = token_store.get(local_user_id)
-    if token is None:
-        return None
+FOLLOW_IDS_PER_REQUEST = 50
+FOLLOWED_ARTISTS_PAGE_SIZE = 50
 
-    if token.is_expired():
-        if not token.refresh_token:
-            return None
-        print(f"Refreshing token for user {local_user_id}")
-        refreshed = await refresh_token_with_refresh_token(token.refresh_token)
-        if refreshed is None:
-            return None
-        token_store[local_user_id] = refreshed
-        return refreshed.access_token
+_search_cache: Optional[TTLCache] = None
+_follow_cache: Optional[TTLCache] = None
+_shared_gets = SingleFlight()
 
-    return token.access_token
 
+def get_search_cache() -> TTLCache:
+    global _search_cache
+    if _search_cache is None:
+        settings = get_settings()
+        _search_cache = TTLCache(settings.spotify_search_cache_size, settings.spotify_search_cache_ttl)
+    return _search_cache
 
-async def _spotify_get(access_token: str, path: str, params: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
-    url = f"{API_BASE}{path}"
+
+metrics.registry.register(metrics.CallbackGauge(
+    "spotify_search_cache_entries", "Entries in the Spotify search cache", lambda: len(get_search_cache())
+))
+metrics.registry.register(metrics.CallbackGauge(
+    "spotify_follow_cache_entries", "Entries in the follow-status cache", lambda: len(get_follow_cache())
+))
+
+
+def _api_url(path: str) -> str:
+    return f"{get_settings().spotify_api_base}{path}"
+
+
+def _normalize_query(q: str) -> str:
+    return " ".join(q.lower().split())
+
+
+def _raise_if_rate_limited(resp: httpx.Response) -> None:
+    if resp.status_code == 429:
+        raise UpstreamRateLimitError("Spotify", parse_retry_after(resp))
+
+
+async def _spotify_get_raw(access_token: str, path: str,
+                           params: Optional[Dict[str, str]] = None) -> Union[bytes, Dict[str, Any]]:
+    url = _api_url(path)
     headers = {"Authorization": f"Bearer {access_token}"}
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url, headers=headers, params=params)
-        if resp.status_code == 401:
-            return {"error": "token_expired_or_invalid"}
-        resp.raise_for_status()
-        return resp.json()
+    resp = await get_scheduler().send(lambda: pool.get_client().get(url, headers=headers, params=params))
+    _raise_if_rate_limited(resp)
+    if resp.status_code == 401:
+        return {"error": "token_expired_or_invalid"}
+    resp.raise_for_status()
+    return resp.content
+
+
+async def _spotify_get(access_token: str, path: str, params: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    body = await _spotify_get_raw(access_token, path, params=params)
+    if isinstance(body, dict):
+        return body
+    with profiling.span("spotify_decode"):
+        return json.loads(body)
+
+
+async def _spotify_get_shared(access_token: str, path: str,
+                              params: Optional[Dict[str, str]] = None) -> Union[bytes, Dict[str, Any]]:
+    # Only for user-agnostic endpoints: concurrent identical GETs share one upstream call,
+    # made with whichever caller's token arrived first.
+    key = (path, tuple(sorted((params or {}).items())))
+    leader = key not in _shared_gets
+    body = await _shared_gets.do(key, lambda: _spotify_get_raw(access_token, path, params=params))
+    if not leader and isinstance(body, dict):
+        # the leader's token was rejected; ours may still be fine
+        body = await _spotify_get_raw(access_token, path, params=params)
+    return body
+
+
+def coalescing_stats() -> Dict[str, Any]:
+    return {"in_flight": len(_shared_gets), "upstream_calls": _shared_gets.calls, "coalesced": _shared_gets.joined}
+
+
+def _search_params(query: str, type_: str, limit: int, market: Optional[str]) -> Dict[str, str]:
+    params = {"q": query, "type": type_, "limit": str(limit)}
+    if market:
+        params["market"] = market
+    return params
+
+
+async def search_raw_with_token(access_token: str, q: str, type_: str, limit: int = 5,
+                                market: Optional[str] = None) -> Union[bytes, Dict[str, Any]]:
+    # the cache keeps Spotify's response bytes as-is: immutable, and ready to pass through untouched
+    query = _normalize_query(q)
+    cache_key = (query, type_, limit, market)
+    cache = get_search_cache()
+    with profiling.span("search_cache"):
+        cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    body = await _spotify_get_shared(access_token, "/search", params=_search_params(query, type_, limit, market))
+    if not isinstance(body, dict):
+        cache.set(cache_key, body)
+    return body
+
+
+async def search_with_token(access_token: str, q: str, type_: str, limit: int = 5,
+                            market: Optional[str] = None) -> Dict[str, Any]:
+    body = await search_raw_with_token(access_token, q, type_, limit, market)
+    return body if isinstance(body, dict) else json.loads(body)
 
 
-async def search_artist(local_user_id: int, q: str, limit: int = 5) -> Dict[str, Any]:
-    token = await _ensure_valid_token_for_user(local_user_id)
+async def search_raw(local_user_id: int, q: str, type_: str, limit: int = 5,
+                     market: Optional[str] = None) -> Union[bytes, Dict[str, Any]]:
+    token = await ensure_valid_token(local_user_id)
     if not token:
         return {"error": "no_valid_token"}
-    return await _spotify_get(token, "/search", params={"q": q, "type": "artist", "limit": str(limit)})
+    return await search_raw_with_token(token, q, type_, limit, market)
 
 
-async def search_track(local_user_id: int, q: str, limit: int = 5) -> Dict[str, Any]:
-    token = await _ensure_valid_token_for_user(local_user_id)
+async def _search(local_user_id: int, q: str, type_: str, limit: int, market: Optional[str]) -> Dict[str, Any]:
+    token = await ensure_valid_token(local_user_id)
     if not token:
         return {"error": "no_valid_token"}
-    return await _spotify_get(token, "/search", params={"q": q, "type": "track", "limit": str(limit)})
+    return await search_with_token(token, q, type_, limit, market)
+
+
+async def search_artist(local_user_id: int, q: str, limit: int = 5, market: Optional[str] = None) -> Dict[str, Any]:
+    return await _search(local_user_id, q, "artist", limit, market)
+
+
+async def search_track(local_user_id: int, q: str, limit: int = 5, market: Optional[str] = None) -> Dict[str, Any]:
+    return await _search(local_user_id, q, "track", limit, market)
+
+
+async def open_search_stream(local_user_id: int, q: str, type_: str, limit: int = 5,
+                             market: Optional[str] = None) -> Union[httpx.Response, Dict[str, Any]]:
+    # Uncached: the caller gets the upstream response with its body still unread and must close it.
+    token = await ensure_valid_token(local_user_id)
+    if not token:
+        return {"error": "no_valid_token"}
+
+    http = pool.get_client()
+    params = _search_params(_normalize_query(q), type_, limit, market)
+    headers = {"Authorization": f"Bearer {token}"}
+    resp = await get_scheduler().send(
+        lambda: http.send(http.build_request("GET", _api_url("/search"), headers=headers, params=params), stream=True)
+    )
+    if resp.status_code != 200:
+        await resp.aread()
+        await resp.aclose()
+        _raise_if_rate_limited(resp)
+        if resp.status_code == 401:
+            return {"error": "token_expired_or_invalid"}
+        resp.raise_for_status()
+    return resp
+
+
+async def _get_several(access_token: str, path: str, key: str, ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+    data = await _spotify_get(access_token, path, params={"ids": ",".join(ids)})
+    if "error" in data:
+        raise ExternalAPIError("Spotify", f"GET {path}: {data['error']}")
+    return data.get(key, [])
+
+
+async def get_several_artists(access_token: str, ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+    return await _get_several(access_token, "/artists", "artists", ids)
+
+
+async def get_several_tracks(access_token: str, ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+    return await _get_several(access_token, "/tracks", "tracks", ids)
 
 
 async def _spotify_put(access_token: str, path: str, params: Optional[Dict[str, str]] = None,
                        json_body: Any = None) -> bool:
-    url = f"{API_BASE}{path}"
+    url = _api_url(path)
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.put(url, headers=headers, params=params, json=json_body)
-        if resp.status_code == 401:
-            return False
-        if resp.status_code not in [200, 204]:
-            print(f"Error PUT Spotify: {resp.text}")
-            resp.raise_for_status()
-        return True
+    resp = await get_scheduler().send(
+        lambda: pool.get_client().put(url, headers=headers, params=params, json=json_body)
+    )
+    _raise_if_rate_limited(resp)
+    if resp.status_code == 401:
+        return False
+    if resp.status_code not in [200, 204]:
+        logger.warning(f"Error PUT Spotify {path}: {resp.status_code} {resp.text}")
+        resp.raise_for_status()
+    return True
+
+
+async def map_chunks(ids: List[str], size: int, fn: Callable[[List[str]], Awaitable[Any]],
+                     concurrency: Optional[int] = None) -> List[Any]:
+    # Spotify caps most multi-ID endpoints, so split the list and run the chunks concurrently;
+    # results come back in chunk order
+    semaphore = asyncio.Semaphore(concurrency or get_settings().spotify_batch_concurrency)
+    chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+
+    async def run(chunk: List[str]) -> Any:
+        async with semaphore:
+            return await fn(chunk)
+
+    return await asyncio.gather(*(run(chunk) for chunk in chunks))
+
+
+def get_follow_cache() -> TTLCache:
+    global _follow_cache
+    if _follow_cache is None:
+        settings = get_settings()
+        _follow_cache = TTLCache(settings.spotify_follow_cache_size, settings.spotify_follow_cache_ttl)
+    return _follow_cache
 
 
 async def follow_ids(local_user_id: int, ids: List[str], type_: str) -> Dict[str, Any]:
-    token = await _ensure_valid_token_for_user(local_user_id)
+    token = await ensure_valid_token(local_user_id)
     if not token: return {"error": "no_valid_token"}
 
     params = {"type": type_}  # 'artist' o 'user'
-    body = {"ids": ids}
 
     try:
-        await _spotify_put(token, "/me/following", params=params, json_body=body)
-        return {"success": True}
+        results = await map_chunks(
+            ids, FOLLOW_IDS_PER_REQUEST,
+            lambda chunk: _spotify_put(token, "/me/following", params=params, json_body={"ids": chunk})
+        )
+    except AppError:
+        raise
     except Exception as e:
         return {"error": str(e)}
+    if not all(results):
+        return {"error": "token_expired_or_invalid"}
+
+    cache = get_follow_cache()
+    for spotify_id in ids:
+        cache.set((local_user_id, type_, spotify_id), True)
+    return {"success": True}
 
 
-async def get_followed_artists(local_user_id: int, limit: int = 20) -> Dict[str, Any]:
-    token = await _ensure_valid_token_for_user(local_user_id)
+async def get_followed_artists(local_user_id: int, limit: int = 20, after: Optional[str] = None) -> Dict[str, Any]:
+    token = await ensure_valid_token(local_user_id)
     if not token: return {"error": "no_valid_token"}
 
     params = {"type": "artist", "limit": str(limit)}
+    if after:
+        params["after"] = after
     return await _spotify_get(token, "/me/following", params=params)
 
 
-async def check_following_status(local_user_id: int, ids: List[str], type_: str) -> Dict[str, Any]:
-    token = await _ensure_valid_token_for_user(local_user_id)
+async def check_following_status(local_user_id: int, ids: List[str], type_: str) -> Union[List[bool], Dict[str, Any]]:
+    token = await ensure_valid_token(local_user_id)
     if not token: return {"error": "no_valid_token"}
 
-    ids_str = ",".join(ids)
-    params = {"type": type_, "ids": ids_str}
+    cache = get_follow_cache()
+    known: Dict[str, bool] = {}
+    for spotify_id in ids:
+        cached = cache.get((local_user_id, type_, spotify_id))
+        if cached is not None:
+            known[spotify_id] = cached
+    missing = list(dict.fromkeys(spotify_id for spotify_id in ids if spotify_id not in known))
+
+    if missing:
+        chunks = await map_chunks(
+            missing, FOLLOW_IDS_PER_REQUEST,
+            lambda chunk: _spotify_get(token, "/me/following/contains", params={"type": type_, "ids": ",".join(chunk)})
+        )
+        flags = []
+        for chunk in chunks:
+            if isinstance(chunk, dict) and "error" in chunk:
+                return chunk
+            flags.extend(chunk)
+        for spotify_id, is_following in zip(missing, flags):
+            known[spotify_id] = is_following
+            cache.set((local_user_id, type_, spotify_id), is_following)
 
-    return await _spotify_get(token, "/me/following/contains", params=params)
+    return [known[spotify_id] for spotify_id in ids]
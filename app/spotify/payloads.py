@@ -0,0 +1,35 @@
+from typing import List, Optional
+
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict
+
+from app.models import SpotifyArtist, SpotifyTrack
+
+
+class ArtistPage(TypedDict):
+    items: List[Optional[SpotifyArtist]]
+
+
+class TrackPage(TypedDict):
+    items: List[Optional[SpotifyTrack]]
+
+
+class ArtistSearchResult(TypedDict):
+    artists: ArtistPage
+
+
+class TrackSearchResult(TypedDict):
+    tracks: TrackPage
+
+
+# built once: validating straight from response bytes skips the intermediate dicts
+ARTIST_SEARCH = TypeAdapter(ArtistSearchResult)
+TRACK_SEARCH = TypeAdapter(TrackSearchResult)
+
+
+def decode_artists(body: bytes) -> List[SpotifyArtist]:
+    return [artist for artist in ARTIST_SEARCH.validate_json(body)["artists"]["items"] if artist is not None]
+
+
+def decode_tracks(body: bytes) -> List[SpotifyTrack]:
+    return [track for track in TRACK_SEARCH.validate_json(body)["tracks"]["items"] if track is not None]
@@ -0,0 +1,103 @@
+import importlib.util
+import logging
+import time
+from typing import Optional, Dict, Any
+
+import httpx
+
+from app import metrics
+from app.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[httpx.AsyncHTTPTransport] = None
+_requests_sent = 0
+
+
+async def _count_request(request: httpx.Request) -> None:
+    global _requests_sent
+    _requests_sent += 1
+
+
+class _MeteredTransport(httpx.AsyncHTTPTransport):
+    # times every upstream attempt (retries included) up to the response headers; URLs here carry
+    # ids in the query string only, so the path is a bounded endpoint label
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = request.url.path
+        start = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except httpx.TransportError:
+            metrics.spotify_request_errors.inc(request.method, endpoint)
+            raise
+        metrics.spotify_request_duration.observe(time.perf_counter() - start, request.method, endpoint)
+        metrics.spotify_requests.inc(request.method, endpoint, str(response.status_code))
+        return response
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _build_client() -> httpx.AsyncClient:
+    global _transport
+    settings = get_settings()
+
+    http2 = settings.spotify_http2
+    if http2 and not _http2_available():
+        logger.warning("SPOTIFY_HTTP2 is enabled but 'h2' is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.spotify_http_max_connections,
+        max_keepalive_connections=settings.spotify_http_max_keepalive_connections,
+        keepalive_expiry=settings.spotify_http_keepalive_expiry
+    )
+    _transport = _MeteredTransport(limits=limits, http2=http2)
+    return httpx.AsyncClient(
+        transport=_transport,
+        timeout=settings.spotify_http_timeout,
+        event_hooks={"request": [_count_request]}
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def startup() -> None:
+    get_client()
+
+
+async def shutdown() -> None:
+    global _client, _transport
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _transport = None
+
+
+def stats() -> Dict[str, Any]:
+    settings = get_settings()
+    connections = []
+    if _transport is not None:
+        pool = getattr(_transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {
+        "open": _client is not None and not _client.is_closed,
+        "http2": settings.spotify_http2 and _http2_available(),
+        "max_connections": settings.spotify_http_max_connections,
+        "max_keepalive_connections": settings.spotify_http_max_keepalive_connections,
+        "keepalive_expiry": settings.spotify_http_keepalive_expiry,
+        "connections": len(connections),
+        "active_connections": len(connections) - idle,
+        "idle_connections": idle,
+        "requests_sent": _requests_sent
+    }
@@ -0,0 +1,169 @@
+import asyncio
+import email.utils
+import math
+import random
+import time
+from typing import Awaitable, Callable, Dict, Any, Optional
+
+import httpx
+
+from app import profiling
+from app.settings import get_settings
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, parsed.timestamp() - time.time())
+
+
+class SpotifyScheduler:
+
+    def __init__(self, rate: float, burst: int, max_concurrency: int, max_retries: int,
+                 backoff_base: float, backoff_max: float, max_retry_after: float,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self._clock = clock
+        self._sleep = sleep
+
+        self._tokens = float(burst)
+        self._updated_at = clock()
+        self._blocked_until = 0.0
+        self._bucket_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+        self.queued = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.server_errors = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def _take_token(self) -> None:
+        async with self._bucket_lock:
+            while True:
+                now = self._clock()
+                if now < self._blocked_until:
+                    await self._sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await self._sleep((1 - self._tokens) / self.rate)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def send(self, request: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        attempt = 0
+        while True:
+            blocked_for = self._blocked_until - self._clock()
+            if blocked_for > self.max_retry_after:
+                # banned for longer than we are willing to wait: answer for Spotify without calling it
+                return httpx.Response(429, headers={"Retry-After": str(math.ceil(blocked_for))})
+
+            queued_at = self._clock()
+            self.queued += 1
+            try:
+                await self._take_token()
+                await self._slots.acquire()
+            finally:
+                self.queued -= 1
+
+            waited = self._clock() - queued_at
+            profiling.record("spotify_wait", waited)
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.requests += 1
+
+            self.in_flight += 1
+            try:
+                with profiling.span("spotify"):
+                    resp = await request()
+            finally:
+                self.in_flight -= 1
+                self._slots.release()
+
+            if resp.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                return resp
+
+            if resp.status_code == 429:
+                self.throttled += 1
+                retry_after = parse_retry_after(resp)
+                if retry_after is not None:
+                    # Spotify's limit is per app, so every queued request has to wait it out
+                    self._blocked_until = max(self._blocked_until, self._clock() + retry_after)
+                    if retry_after > self.max_retry_after:
+                        return resp
+                    delay = retry_after + random.uniform(0, self.backoff_base)
+                else:
+                    delay = self._backoff(attempt)
+            else:
+                self.server_errors += 1
+                delay = self._backoff(attempt)
+
+            # release the connection of a response we are discarding (matters for streamed ones)
+            await resp.aclose()
+            attempt += 1
+            self.retries += 1
+            profiling.record("spotify_backoff", delay)
+            await self._sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "server_errors": self.server_errors,
+            "avg_wait_seconds": round(self.total_wait / self.requests, 6) if self.requests else 0.0,
+            "max_wait_seconds": round(self.max_wait, 6),
+            "blocked_for_seconds": round(max(0.0, self._blocked_until - self._clock()), 3)
+        }
+
+
+_scheduler: Optional[SpotifyScheduler] = None
+
+
+def get_scheduler() -> SpotifyScheduler:
+    global _scheduler
+    if _scheduler is None:
+        settings = get_settings()
+        _scheduler = SpotifyScheduler(
+            rate=settings.spotify_rate_limit_per_second,
+            burst=settings.spotify_rate_limit_burst,
+            max_concurrency=settings.spotify_max_concurrency,
+            max_retries=settings.spotify_max_retries,
+            backoff_base=settings.spotify_retry_backoff_base,
+            backoff_max=settings.spotify_retry_backoff_max,
+            max_retry_after=settings.spotify_max_retry_after
+        )
+    return _scheduler
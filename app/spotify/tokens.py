@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app import metrics, profiling
+from app.database import token_store
+from app.models import SpotifyToken
+from app.settings import get_settings
+from app.spotify.auth import refresh_token_with_refresh_token, request_client_credentials_token
+from app.spotify.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_refreshes = SingleFlight()
+_refresher_task: Optional[asyncio.Task] = None
+_app_token: Optional[SpotifyToken] = None
+
+
+async def _refresh(local_user_id: int, token: SpotifyToken) -> Optional[SpotifyToken]:
+    try:
+        refreshed = await refresh_token_with_refresh_token(token.refresh_token)
+    except Exception:
+        metrics.token_refreshes.inc("user", "error")
+        raise
+    if refreshed is None:
+        metrics.token_refreshes.inc("user", "rejected")
+        return None
+    metrics.token_refreshes.inc("user", "success")
+    # the user may have logged in again while we were refreshing; keep the newer token
+    if token_store.get(local_user_id) is token:
+        token_store[local_user_id] = refreshed
+    return token_store.get(local_user_id)
+
+
+async def refresh_user_token(local_user_id: int) -> Optional[SpotifyToken]:
+    token = token_store.get(local_user_id)
+    if token is None or not token.refresh_token:
+        return None
+    return await _refreshes.do(local_user_id, lambda: _refresh(local_user_id, token))
+
+
+async def ensure_valid_token(local_user_id: int) -> Optional[str]:
+    token = token_store.get(local_user_id)
+    if token is None:
+        return None
+
+    if token.is_expired():
+        with profiling.span("token_refresh"):
+            refreshed = await refresh_user_token(local_user_id)
+        if refreshed is None:
+            return None
+        return refreshed.access_token
+
+    return token.access_token
+
+
+async def _request_app_token() -> Optional[SpotifyToken]:
+    global _app_token
+    try:
+        _app_token = await request_client_credentials_token()
+    except Exception:
+        metrics.token_refreshes.inc("app", "error")
+        raise
+    metrics.token_refreshes.inc("app", "success" if _app_token else "rejected")
+    return _app_token
+
+
+async def ensure_app_token() -> Optional[str]:
+    # app-level token (client credentials) for background work that has no user behind it
+    token = _app_token
+    if token is None or token.is_expired():
+        token = await _refreshes.do("app", _request_app_token)
+    return token.access_token if token else None
+
+
+async def refresh_expiring_tokens(margin_seconds: int, concurrency: int = 10) -> int:
+    due = [
+        user_id for user_id, token in list(token_store.items())
+        if token.refresh_token and token.is_expired(margin_seconds)
+    ]
+    if not due:
+        return 0
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def refresh_one(user_id: int) -> Optional[SpotifyToken]:
+        async with semaphore:
+            return await refresh_user_token(user_id)
+
+    results = await asyncio.gather(*(refresh_one(user_id) for user_id in due), return_exceptions=True)
+    refreshed = 0
+    for user_id, result in zip(due, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Background token refresh failed for user {user_id}: {result}")
+        elif result is None:
+            logger.warning(f"Background token refresh rejected for user {user_id}")
+        else:
+            refreshed += 1
+    return refreshed
+
+
+async def run_token_refresher(interval_seconds: float, margin_seconds: int, concurrency: int) -> None:
+    while True:
+        try:
+            await refresh_expiring_tokens(margin_seconds, concurrency)
+        except Exception:
+            logger.exception("Background token refresh pass failed")
+        await asyncio.sleep(interval_seconds)
+
+
+async def startup() -> None:
+    global _refresher_task
+    settings = get_settings()
+    if settings.spotify_token_refresh_interval <= 0 or _refresher_task is not None:
+        return
+    _refresher_task = asyncio.create_task(run_token_refresher(
+        settings.spotify_token_refresh_interval,
+        settings.spotify_token_refresh_margin,
+        settings.spotify_token_refresh_concurrency
+    ))
+
+
+async def shutdown() -> None:
+    global _refresher_task
+    if _refresher_task is None:
+        return
+    _refresher_task.cancel()
+    try:
+        await _refresher_task
+    except asyncio.CancelledError:
+        pass
+    _refresher_task = None
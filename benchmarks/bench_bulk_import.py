@@ -0,0 +1,57 @@
+"""Rows per second for POST /users/bulk versus one POST /users/ per row.
+
+Run with: python -m benchmarks.bench_bulk_import [--rows 20000]
+"""
+import argparse
+import json
+import logging
+import time
+
+from fastapi.testclient import TestClient
+
+from app.database import user_repository
+from app.services import UserService
+from main import app
+
+
+def _rows(count: int):
+    return [{"name": f"user {i}", "age": 20 + i % 60, "music_preferences": ["Rock", "Jazz"]} for i in range(count)]
+
+
+def _reset():
+    user_repository.clear()
+    UserService.rebuild_indexes()
+
+
+def run(rows: int) -> None:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    payload = _rows(rows)
+    with TestClient(app) as client:
+        _reset()
+        single_rows = payload[:min(rows, 2000)]
+        start = time.perf_counter()
+        for row in single_rows:
+            client.post("/users/", json=row)
+        single = len(single_rows) / (time.perf_counter() - start)
+
+        _reset()
+        start = time.perf_counter()
+        client.post("/users/bulk", json=payload)
+        bulk_json = rows / (time.perf_counter() - start)
+
+        _reset()
+        body = "\n".join(json.dumps(row) for row in payload)
+        start = time.perf_counter()
+        client.post("/users/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+        bulk_ndjson = rows / (time.perf_counter() - start)
+        _reset()
+
+    print(f"single POST /users/   {single:>12,.0f} rows/s")
+    print(f"bulk JSON array       {bulk_json:>12,.0f} rows/s")
+    print(f"bulk NDJSON           {bulk_ndjson:>12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20_000)
+    run(parser.parse_args().rows)
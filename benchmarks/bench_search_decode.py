@@ -0,0 +1,77 @@
+"""Decoding Spotify search pages into models, and writing models back out as responses.
+
+Compares json.loads + field-by-field model construction (old path) with TypeAdapter.validate_json
+straight from the bytes, and response_model re-validation with a direct model_dump_json.
+
+Run with: python -m benchmarks.bench_search_decode [--items 50] [--requests 2000]
+"""
+import argparse
+import json
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.models import SpotifyArtist, SpotifyTrack, User
+from app.spotify.payloads import decode_tracks
+from benchmarks.bench_search_passthrough import _search_body
+
+
+def _cpu_per_request_us(fn, arg, requests: int) -> float:
+    start = time.process_time()
+    for _ in range(requests):
+        fn(arg)
+    return (time.process_time() - start) / requests * 1_000_000
+
+
+def field_by_field(body: bytes) -> List[SpotifyTrack]:
+    data = json.loads(body)
+    return [
+        SpotifyTrack(
+            id=raw["id"], name=raw["name"], popularity=raw.get("popularity"), duration_ms=raw["duration_ms"],
+            explicit=raw["explicit"], album_name=raw["album"]["name"], href=raw["href"], uri=raw["uri"],
+            artists=[SpotifyArtist(id=a["id"], name=a["name"], href=a["href"], uri=a["uri"]) for a in raw["artists"]]
+        )
+        for raw in data["tracks"]["items"]
+    ]
+
+
+_USER = TypeAdapter(User)
+
+
+def revalidate_response(user: User) -> bytes:
+    # what FastAPI does with a response_model: validate the returned value, dump it, then json.dumps it
+    return JSONResponse(_USER.dump_python(_USER.validate_python(user), mode="json")).body
+
+
+def direct_response(user: User) -> bytes:
+    return user.model_dump_json().encode()
+
+
+def run(items: int, requests: int) -> None:
+    body = _search_body(items)
+    tracks = decode_tracks(body)
+    assert tracks == field_by_field(body)
+
+    before = _cpu_per_request_us(field_by_field, body, requests)
+    after = _cpu_per_request_us(decode_tracks, body, requests)
+    print(f"search page {len(body) / 1024:.1f} KiB, {items} items")
+    print(f"json.loads + field by field  {before:>10.1f} us CPU/page")
+    print(f"TypeAdapter.validate_json    {after:>10.1f} us CPU/page  ({before / after:.1f}x)")
+
+    user = User(id=1, name="Ana Lopez", age=30, music_preferences=["Rock", "Jazz"],
+                favorite_tracks=tracks, favorite_artists=tracks[0].artists * items)
+    before = _cpu_per_request_us(revalidate_response, user, requests)
+    after = _cpu_per_request_us(direct_response, user, requests)
+    print(f"user with {items} favorite tracks and artists")
+    print(f"response_model round-trip    {before:>10.1f} us CPU/response")
+    print(f"model_dump_json              {after:>10.1f} us CPU/response  ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.items, args.requests)
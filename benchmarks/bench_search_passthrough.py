@@ -0,0 +1,56 @@
+"""CPU cost per search response: decode + re-encode (old path) versus raw passthrough.
+
+Run with: python -m benchmarks.bench_search_passthrough [--items 50] [--requests 2000]
+"""
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+
+def _search_body(items: int) -> bytes:
+    track = {
+        "id": "4uLU6hMCjMI75M1A2tKUQC", "name": "Never Gonna Give You Up", "popularity": 80,
+        "duration_ms": 213573, "explicit": False, "href": "https://api.spotify.com/v1/tracks/4uLU6hMCjMI75M1A2tKUQC",
+        "uri": "spotify:track:4uLU6hMCjMI75M1A2tKUQC", "available_markets": ["ES", "US", "GB", "FR", "DE"] * 20,
+        "album": {"name": "Whenever You Need Somebody", "images": [{"url": "https://i.scdn.co/image/x",
+                                                                    "height": 640, "width": 640}] * 3},
+        "artists": [{"id": "0gxyHStUsqpMadRV0Di1Qt", "name": "Rick Astley",
+                     "href": "https://api.spotify.com/v1/artists/0gxyHStUsqpMadRV0Di1Qt",
+                     "uri": "spotify:artist:0gxyHStUsqpMadRV0Di1Qt"}],
+    }
+    return json.dumps({"tracks": {"items": [track] * items, "total": items, "limit": items, "offset": 0}}).encode()
+
+
+def _cpu_per_request_us(fn, body: bytes, requests: int) -> float:
+    start = time.process_time()
+    for _ in range(requests):
+        fn(body)
+    return (time.process_time() - start) / requests * 1_000_000
+
+
+def decode_encode(body: bytes) -> bytes:
+    return JSONResponse(jsonable_encoder(json.loads(body))).body
+
+
+def passthrough(body: bytes) -> bytes:
+    return Response(content=body, media_type="application/json").body
+
+
+def run(items: int, requests: int) -> None:
+    body = _search_body(items)
+    before = _cpu_per_request_us(decode_encode, body, requests)
+    after = _cpu_per_request_us(passthrough, body, requests)
+    print(f"payload {len(body) / 1024:.1f} KiB, {items} items")
+    print(f"decode + re-encode  {before:>10.1f} us CPU/request")
+    print(f"passthrough         {after:>10.1f} us CPU/request  ({before / after:.0f}x less)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.items, args.requests)
@@ -0,0 +1,120 @@
+"""Latency and recall of similar-user lookups (MinHash LSH) against a full pairwise Jaccard scan.
+
+The index is built twice: in place, for the build time, and in a worker thread the way the app does
+it, reporting how late a 1 ms timer on the event loop fires meanwhile.
+
+Users get a few genres and a power-law sample of favorite artists and tracks, so popular items are
+shared by many users the way real favorites are. Recall@k compares the LSH top-k with the exact
+top-k from the scan; a miss only counts when the exact neighbour scores higher than the LSH's k-th.
+
+Run with: python -m benchmarks.bench_similar_users [--users 100000] [--queries 1000] [--k 10]
+                                                 [--bands 16] [--rows 3] [--max-candidates 5000]
+"""
+import argparse
+import asyncio
+import heapq
+import random
+import statistics
+import time
+
+from app.indexes.similarity import SimilarityIndex, jaccard
+from app.models import User, SpotifyArtist, SpotifyTrack
+
+GENRES = [f"Genre {i}" for i in range(40)]
+
+
+def _item(cls, kind: str, item_id: int, **extra):
+    return cls.model_construct(id=f"{kind}{item_id}", name=f"{kind} {item_id}", href="", uri="", **extra)
+
+
+def _users(count: int, seed: int):
+    rng = random.Random(seed)
+    artists = [_item(SpotifyArtist, "a", i, genres=[]) for i in range(20_000)]
+    tracks = [_item(SpotifyTrack, "t", i, duration_ms=1, explicit=False, artists=[], album_name="")
+              for i in range(60_000)]
+
+    def pick(pool, most: int):
+        # Pareto-distributed ranks: a handful of very popular items and a long tail
+        picked = {min(int(rng.paretovariate(0.7)) - 1, len(pool) - 1) for _ in range(rng.randint(0, most))}
+        return [pool[i] for i in picked]
+
+    for user_id in range(1, count + 1):
+        yield User.model_construct(
+            id=user_id, name=f"User {user_id}", age=30,
+            music_preferences=rng.sample(GENRES, rng.randint(1, 4)),
+            favorite_artists=pick(artists, 15), favorite_tracks=pick(tracks, 15),
+        )
+
+
+def _exact_top(index: SimilarityIndex, user_id: int, k: int):
+    items = index._items[user_id]
+    scored = ((jaccard(items, other_items), other) for other, other_items in index._items.items() if other != user_id)
+    return heapq.nlargest(k, scored, key=lambda pair: (pair[0], -pair[1]))
+
+
+def _percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * pct), len(ordered) - 1)]
+
+
+async def _loop_lag_during_build(index: SimilarityIndex, population) -> list:
+    build = asyncio.create_task(asyncio.to_thread(index.compute, population))
+    lags = []
+    while not build.done():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - started - 0.001) * 1000)
+    await build
+    return lags
+
+
+def run(users: int, queries: int, k: int, exact_queries: int, seed: int, **options) -> None:
+    index = SimilarityIndex(**options)
+    population = list(_users(users, seed))
+    started = time.perf_counter()
+    index.ensure_built(population)
+    build = time.perf_counter() - started
+    print(f"indexed {len(index)} users in {build:.1f} s ({build / users * 1e6:.0f} us/user)")
+
+    lags = asyncio.run(_loop_lag_during_build(SimilarityIndex(**options), population))
+    print(f"background build, event loop lag:  p50 {statistics.median(lags):.2f} ms  "
+          f"p99 {_percentile(lags, 0.99):.2f} ms  max {max(lags):.2f} ms")
+
+    rng = random.Random(seed + 1)
+    sample = rng.sample(range(1, users + 1), queries)
+    latencies = []
+    for user_id in sample:
+        started = time.perf_counter()
+        index.similar(user_id, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    print(f"LSH top-{k}:  p50 {statistics.median(latencies):.2f} ms  p95 {_percentile(latencies, 0.95):.2f} ms  "
+          f"p99 {_percentile(latencies, 0.99):.2f} ms  max {max(latencies):.2f} ms")
+
+    scan_latencies, hits, wanted = [], 0, 0
+    for user_id in sample[:exact_queries]:
+        started = time.perf_counter()
+        exact = _exact_top(index, user_id, k)
+        scan_latencies.append((time.perf_counter() - started) * 1000)
+        approx = index.similar(user_id, k)
+        floor = approx[-1][1] if len(approx) == k else 0.0
+        found = {other for other, _ in approx}
+        relevant = [other for score, other in exact if score > 0]
+        wanted += len(relevant)
+        hits += sum(1 for score, other in exact if score > 0 and (other in found or score <= floor))
+    print(f"full scan:  p50 {statistics.median(scan_latencies):.2f} ms  (over {exact_queries} queries)")
+    print(f"recall@{k}: {hits / wanted:.3f}" if wanted else f"recall@{k}: no similar users in the sample")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--exact-queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--max-candidates", type=int, default=5000)
+    args = parser.parse_args()
+    run(args.users, args.queries, args.k, args.exact_queries, args.seed,
+        bands=args.bands, rows=args.rows, max_candidates=args.max_candidates)
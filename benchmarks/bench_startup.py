@@ -0,0 +1,129 @@
+"""Cold-start cost of a worker: import time of main.py and time until the first request is served.
+
+Each sample is a fresh interpreter. The import report comes from `python -X importtime -c "import main"`
+(median over the runs, heaviest modules listed); time-to-first-request spawns `uvicorn main:app`
+and polls until GET /users/ answers. Results are compared with benchmarks/startup_baseline.json.
+
+Run with: python -m benchmarks.bench_startup [--runs 5] [--top 15] [--save-baseline] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE = Path(__file__).with_name("startup_baseline.json")
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+ENV = {
+    **os.environ,
+    "SPOTIFY_CLIENT_ID": "bench", "SPOTIFY_CLIENT_SECRET": "bench", "SPOTIFY_REDIRECT_URI": "http://127.0.0.1/cb",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def _import_profile() -> Dict[str, Tuple[int, int]]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=ENV,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _time_to_first_request(timeout: float = 30.0) -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/users/?limit=1"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                "--log-level", "warning"], cwd=ROOT, env=ENV)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f"no response from {url} within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def run(runs: int, top: int) -> Dict[str, float]:
+    profiles = [_import_profile() for _ in range(runs)]
+    self_us: Dict[str, List[int]] = defaultdict(list)
+    cumulative_us: Dict[str, List[int]] = defaultdict(list)
+    for profile in profiles:
+        for module, (own, cumulative) in profile.items():
+            self_us[module].append(own)
+            cumulative_us[module].append(cumulative)
+
+    import_ms = statistics.median(cumulative_us["main"]) / 1000
+    print(f"import main: {import_ms:.1f} ms (median of {runs})")
+    print(f"{'module':<50}{'self ms':>10}{'cumul. ms':>11}")
+    heaviest = sorted(self_us, key=lambda module: statistics.median(self_us[module]), reverse=True)[:top]
+    for module in heaviest:
+        print(f"{module:<50}{statistics.median(self_us[module]) / 1000:>10.1f}"
+              f"{statistics.median(cumulative_us[module]) / 1000:>11.1f}")
+    for group in ("fastapi", "pydantic", "pydantic_settings", "httpx", "app.routes", "app.spotify"):
+        if group in cumulative_us:
+            print(f"  {group:<20}{statistics.median(cumulative_us[group]) / 1000:>8.1f} ms cumulative")
+        else:
+            print(f"  {group:<20}{'not imported':>19}")
+
+    first_request_ms = statistics.median(_time_to_first_request() for _ in range(runs)) * 1000
+    print(f"time to first request: {first_request_ms:.1f} ms (median of {runs})")
+    return {"import_ms": round(import_ms, 1), "first_request_ms": round(first_request_ms, 1)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    result = run(args.runs, args.top)
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"baseline saved to {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        print(f"no baseline at {baseline_path}; run with --save-baseline to record one")
+        return 0
+
+    baseline = json.loads(baseline_path.read_text())
+    regressions = [f"{key}: {result[key]} ms vs baseline {expected} ms"
+                   for key, expected in baseline.items() if result[key] > expected * (1 + args.tolerance)]
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"within {args.tolerance:.0%} of baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
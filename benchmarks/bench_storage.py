@@ -0,0 +1,63 @@
+"""CRUD throughput of the in-memory and SQLite storage backends.
+
+The SQLite figures include the time needed to flush every queued write to disk.
+
+Run with: python -m benchmarks.bench_storage [--users 20000]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.database.base import Storage
+from app.database.memory import InMemoryStorage
+from app.database.sqlite import SQLiteStorage
+from app.models import User
+
+
+async def _measure(storage: Storage, users: int) -> dict:
+    await storage.startup()
+    flush = getattr(storage, "flush", None)
+    results = {}
+
+    async def timed(name, op):
+        start = time.perf_counter()
+        for user_id in range(1, users + 1):
+            op(user_id)
+        if flush is not None:
+            await flush()
+        results[name] = users / (time.perf_counter() - start)
+
+    await timed("create", lambda _: storage.users.add(User(
+        id=storage.users.next_id(), name="Bench User", age=30, music_preferences=["Rock", "Pop"]
+    )))
+    await timed("read", storage.users.get)
+
+    def update(user_id):
+        user = storage.users.get(user_id)
+        user.age = 31
+        storage.users.update(user)
+
+    await timed("update", update)
+    await timed("delete", storage.users.delete)
+    await storage.shutdown()
+    return results
+
+
+async def main(users: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memory": InMemoryStorage(),
+            "sqlite": SQLiteStorage(os.path.join(tmp, "bench.db")),
+        }
+        print(f"{'backend':<8} {'create/s':>12} {'read/s':>12} {'update/s':>12} {'delete/s':>12}")
+        for name, storage in backends.items():
+            r = await _measure(storage, users)
+            print(f"{name:<8} {r['create']:>12,.0f} {r['read']:>12,.0f} {r['update']:>12,.0f} {r['delete']:>12,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20_000)
+    asyncio.run(main(parser.parse_args().users))
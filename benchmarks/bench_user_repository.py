@@ -0,0 +1,53 @@
+"""Lookup/update/delete latency of the user repository as the store grows.
+
+Run with: python -m benchmarks.bench_user_repository [--sizes 1000 10000 100000 1000000]
+"""
+import argparse
+import random
+import time
+
+from app.database.memory import InMemoryUserRepository
+from app.models import User
+
+
+def _populate(repository: InMemoryUserRepository, size: int) -> None:
+    for _ in range(size):
+        user_id = repository.next_id()
+        repository.add(User.model_construct(
+            id=user_id, name=f"User {user_id}", age=30, music_preferences=["Rock"],
+            favorite_artists=[], favorite_tracks=[]
+        ))
+
+
+def _per_op_ns(fn, ids) -> float:
+    start = time.perf_counter_ns()
+    for user_id in ids:
+        fn(user_id)
+    return (time.perf_counter_ns() - start) / len(ids)
+
+
+def run(sizes, operations: int) -> None:
+    print(f"{'users':>10} {'get ns/op':>12} {'update ns/op':>14} {'delete ns/op':>14} {'list scan ns/op':>16}")
+    for size in sizes:
+        repository = InMemoryUserRepository()
+        _populate(repository, size)
+        ids = random.sample(range(1, size + 1), min(operations, size))
+
+        get_ns = _per_op_ns(repository.get, ids)
+        update_ns = _per_op_ns(lambda user_id: repository.update(repository.get(user_id)), ids)
+
+        # the old list-backed store, measured on a few lookups only since it is O(n)
+        users = repository.list()
+        scan_ids = ids[:20]
+        scan_ns = _per_op_ns(lambda user_id: next(u for u in users if u.id == user_id), scan_ids)
+
+        delete_ns = _per_op_ns(repository.delete, ids)
+        print(f"{size:>10} {get_ns:>12.0f} {update_ns:>14.0f} {delete_ns:>14.0f} {scan_ns:>16.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--operations", type=int, default=10_000)
+    args = parser.parse_args()
+    run(args.sizes, args.operations)
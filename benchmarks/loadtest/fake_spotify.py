@@ -0,0 +1,141 @@
+"""Local stand-in for the Spotify Web API and accounts service, used by the load test.
+
+Serves the endpoints this app calls (token, search, following, several artists/tracks) with
+deterministic payloads, a configurable response latency and a configurable share of 429s.
+
+Run with: python -m benchmarks.loadtest.fake_spotify [--port 8900] [--latency-ms 40] [--rate-limit-ratio 0.01]
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import random
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, Response
+
+FOLLOWED_ARTISTS = 120
+
+
+def _spotify_id(seed: str) -> str:
+    return hashlib.sha1(seed.encode()).hexdigest()[:22]
+
+
+def _artist(artist_id: str, name: str, full: bool = True) -> dict:
+    artist = {
+        "id": artist_id, "name": name, "type": "artist",
+        "href": f"https://api.spotify.com/v1/artists/{artist_id}", "uri": f"spotify:artist:{artist_id}"
+    }
+    if full:
+        artist.update(popularity=int(artist_id[:2], 16) % 100, genres=["rock", "indie"],
+                      followers={"href": None, "total": 1000},
+                      images=[{"url": f"https://i.scdn.co/image/{artist_id}", "height": 640, "width": 640}])
+    return artist
+
+
+def _track(track_id: str, name: str) -> dict:
+    artist_id = _spotify_id(f"artist-of-{track_id}")
+    return {
+        "id": track_id, "name": name, "type": "track", "popularity": int(track_id[:2], 16) % 100,
+        "duration_ms": 180000 + int(track_id[2:5], 16), "explicit": False, "disc_number": 1, "track_number": 1,
+        "href": f"https://api.spotify.com/v1/tracks/{track_id}", "uri": f"spotify:track:{track_id}",
+        "available_markets": ["ES", "US", "GB", "FR", "DE", "IT", "PT", "MX", "AR", "BR"],
+        "album": {"id": _spotify_id(f"album-of-{track_id}"), "name": f"{name} (Album)", "album_type": "album",
+                  "images": [{"url": f"https://i.scdn.co/image/{track_id}", "height": 640, "width": 640}]},
+        "artists": [_artist(artist_id, f"Artist {artist_id[:6]}", full=False)]
+    }
+
+
+def create_app(latency_ms: float = 40.0, jitter_ms: float = 10.0, rate_limit_ratio: float = 0.01,
+               retry_after: int = 1, seed: int = 0) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(seed)
+    token_ids = itertools.count(1)
+    counters = {"requests": 0, "rate_limited": 0}
+
+    @app.middleware("http")
+    async def simulate_upstream(request: Request, call_next):
+        counters["requests"] += 1
+        await asyncio.sleep(max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+        if request.url.path.startswith("/v1/"):
+            if not request.headers.get("authorization", "").startswith("Bearer "):
+                return JSONResponse({"error": {"status": 401, "message": "No token provided"}}, status_code=401)
+            if rng.random() < rate_limit_ratio:
+                counters["rate_limited"] += 1
+                return JSONResponse({"error": {"status": 429, "message": "API rate limit exceeded"}},
+                                    status_code=429, headers={"Retry-After": str(retry_after)})
+        return await call_next(request)
+
+    @app.get("/health")
+    async def health():
+        return counters
+
+    @app.post("/api/token")
+    async def token(request: Request):
+        # parsed by hand: FastAPI's Form() needs python-multipart, which isn't a project dependency
+        if not request.headers.get("authorization"):
+            return JSONResponse({"error": "invalid_client"}, status_code=401)
+        grant_type = parse_qs((await request.body()).decode()).get("grant_type", [""])[0]
+        body = {"access_token": f"fake-access-{next(token_ids)}", "token_type": "Bearer", "expires_in": 3600}
+        if grant_type == "authorization_code":
+            body.update(refresh_token=f"fake-refresh-{next(token_ids)}",
+                        scope="user-read-private user-read-email user-follow-read user-follow-modify")
+        elif grant_type == "refresh_token":
+            body["scope"] = "user-read-private user-read-email user-follow-read user-follow-modify"
+        return body
+
+    @app.get("/v1/search")
+    async def search(q: str, type: str, limit: int = 20):
+        names = [f"{q.title()} {n}" if n else q.title() for n in range(limit)]
+        if type == "artist":
+            items = [_artist(_spotify_id(f"artist:{name}"), name) for name in names]
+            return {"artists": {"items": items, "total": 1000, "limit": limit, "offset": 0}}
+        items = [_track(_spotify_id(f"track:{name}"), name) for name in names]
+        return {"tracks": {"items": items, "total": 1000, "limit": limit, "offset": 0}}
+
+    @app.get("/v1/me/following")
+    async def followed(limit: int = 20, after: Optional[str] = None):
+        ids = [_spotify_id(f"followed:{n}") for n in range(FOLLOWED_ARTISTS)]
+        start = ids.index(after) + 1 if after in ids else 0
+        page = ids[start:start + limit]
+        cursor = page[-1] if page and start + limit < len(ids) else None
+        items = [_artist(artist_id, f"Followed {artist_id[:6]}") for artist_id in page]
+        return {"artists": {"items": items, "limit": limit, "total": len(ids), "cursors": {"after": cursor}}}
+
+    @app.put("/v1/me/following")
+    async def follow():
+        return Response(status_code=204)
+
+    @app.get("/v1/me/following/contains")
+    async def contains(ids: str):
+        return [int(spotify_id.encode().hex(), 16) % 2 == 0 for spotify_id in ids.split(",")]
+
+    @app.get("/v1/artists")
+    async def several_artists(ids: str = Query(...)):
+        return {"artists": [_artist(artist_id, f"Artist {artist_id[:6]}") for artist_id in ids.split(",")]}
+
+    @app.get("/v1/tracks")
+    async def several_tracks(ids: str = Query(...)):
+        return {"tracks": [_track(track_id, f"Track {track_id[:6]}") for track_id in ids.split(",")]}
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.01)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    app = create_app(args.latency_ms, args.jitter_ms, args.rate_limit_ratio, args.retry_after, args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
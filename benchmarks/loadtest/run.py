@@ -0,0 +1,342 @@
+"""End-to-end load test: the app from main.py against the local Spotify stand-in.
+
+Starts benchmarks.loadtest.fake_spotify and `uvicorn main:app` as subprocesses, seeds users and
+links each one to Spotify through the real OAuth callback, then drives a weighted mix of /users
+and /spotify requests at a fixed concurrency. Reports throughput and p50/p95/p99 latency per
+route and compares them with a stored baseline, exiting with status 1 on a regression.
+
+Run with: python -m benchmarks.loadtest.run [--duration 15] [--concurrency 32] [--users 200]
+          [--latency-ms 40] [--rate-limit-ratio 0.01] [--runs 1] [--save-baseline] [--tolerance 0.25]
+
+Upstream-bound routes queue behind the rate limiter, so their tail latency moves between runs:
+record baselines with --runs 3 --save-baseline (keeps the slowest of each metric) on the machine
+that will run the comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[2]
+BASELINE = Path(__file__).with_name("baseline.json")
+
+QUERIES = [f"song {n}" for n in range(100)]
+ARTISTS = [f"band {n}" for n in range(50)]
+GENRES = ["Rock", "Jazz", "Pop", "Indie", "Metal", "Reggaeton", "Classical", "Techno"]
+OK_STATUSES = {200, 201, 204, 304}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _user_payload(rng: random.Random) -> dict:
+    return {"name": f"Load User {rng.randrange(10_000)}", "age": rng.randint(19, 90),
+            "music_preferences": rng.sample(GENRES, 3)}
+
+
+class Scenario:
+    # each step returns the route template it hit and the response, so results group per route
+
+    def __init__(self, client: httpx.AsyncClient, user_ids: List[int], rng: random.Random):
+        self.client = client
+        self.user_ids = user_ids
+        self.rng = rng
+        self.etags: Dict[int, str] = {}
+
+    async def get_user(self):
+        user_id = self.rng.choice(self.user_ids)
+        headers = {"If-None-Match": self.etags[user_id]} if user_id in self.etags else {}
+        resp = await self.client.get(f"/users/{user_id}", headers=headers)
+        if "etag" in resp.headers:
+            self.etags[user_id] = resp.headers["etag"]
+        return "GET /users/{id}", resp
+
+    async def list_users(self):
+        after = self.rng.choice(self.user_ids) - 1
+        return "GET /users/", await self.client.get("/users/", params={"after": after, "limit": 50})
+
+    async def update_user(self):
+        user_id = self.rng.choice(self.user_ids)
+        return "PUT /users/{id}", await self.client.put(f"/users/{user_id}", json=_user_payload(self.rng))
+
+    async def search_track(self):
+        params = {"user_id": self.rng.choice(self.user_ids), "q": self.rng.choice(QUERIES)}
+        return "GET /spotify/search/track", await self.client.get("/spotify/search/track", params=params)
+
+    async def search_artist(self):
+        params = {"user_id": self.rng.choice(self.user_ids), "q": self.rng.choice(ARTISTS)}
+        return "GET /spotify/search/artist", await self.client.get("/spotify/search/artist", params=params)
+
+    async def add_favorite_artist(self):
+        user_id = self.rng.choice(self.user_ids)
+        resp = await self.client.post(f"/users/{user_id}/favorites/artists",
+                                      params={"artist_name": self.rng.choice(ARTISTS)})
+        return "POST /users/{id}/favorites/artists", resp
+
+    async def followed_artists(self):
+        params = {"user_id": self.rng.choice(self.user_ids), "max_items": 100}
+        return "GET /spotify/me/following/artists", await self.client.get("/spotify/me/following/artists",
+                                                                          params=params)
+
+    async def check_following(self):
+        ids = ",".join(f"{self.rng.getrandbits(64):016x}" for _ in range(20))
+        params = {"user_id": self.rng.choice(self.user_ids), "ids": ids, "type": "artist"}
+        return "GET /spotify/me/following/contains", await self.client.get("/spotify/me/following/contains",
+                                                                           params=params)
+
+    async def follow(self):
+        ids = [f"{self.rng.getrandbits(64):016x}" for _ in range(5)]
+        params = {"user_id": self.rng.choice(self.user_ids), "type": "artist"}
+        return "PUT /spotify/me/following", await self.client.put("/spotify/me/following", params=params, json=ids)
+
+
+MIX = [
+    (Scenario.get_user, 30),
+    (Scenario.list_users, 10),
+    (Scenario.update_user, 5),
+    (Scenario.search_track, 20),
+    (Scenario.search_artist, 10),
+    (Scenario.add_favorite_artist, 5),
+    (Scenario.followed_artists, 5),
+    (Scenario.check_following, 10),
+    (Scenario.follow, 5),
+]
+
+
+class Servers:
+
+    def __init__(self, latency_ms: float, rate_limit_ratio: float, seed: int):
+        self.fake_port = _free_port()
+        self.app_port = _free_port()
+        self.fake_args = ["--port", str(self.fake_port), "--latency-ms", str(latency_ms),
+                          "--rate-limit-ratio", str(rate_limit_ratio), "--seed", str(seed)]
+        self.processes: List[subprocess.Popen] = []
+
+    @property
+    def app_url(self) -> str:
+        return f"http://127.0.0.1:{self.app_port}"
+
+    @property
+    def fake_url(self) -> str:
+        return f"http://127.0.0.1:{self.fake_port}"
+
+    def start(self) -> None:
+        self.processes.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.loadtest.fake_spotify", *self.fake_args], cwd=ROOT
+        ))
+        env = {
+            **os.environ,
+            "SPOTIFY_CLIENT_ID": "loadtest", "SPOTIFY_CLIENT_SECRET": "loadtest",
+            "SPOTIFY_REDIRECT_URI": f"{self.app_url}/users/auth/callback",
+            "SPOTIFY_API_BASE": f"{self.fake_url}/v1", "SPOTIFY_ACCOUNTS_BASE": self.fake_url,
+            "STORAGE_BACKEND": "memory", "LOG_LEVEL": "WARNING",
+        }
+        self.processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.app_port), "--log-level", "warning",
+             "--no-access-log"], cwd=ROOT, env=env
+        ))
+
+    async def wait_ready(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            for url in (f"{self.fake_url}/health", f"{self.app_url}/users/?limit=1"):
+                while True:
+                    try:
+                        if (await client.get(url)).status_code == 200:
+                            break
+                    except httpx.TransportError:
+                        pass
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"{url} did not come up within {timeout}s")
+                    await asyncio.sleep(0.1)
+
+    def stop(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def seed_users(client: httpx.AsyncClient, users: int, rng: random.Random) -> List[int]:
+    resp = await client.post("/users/bulk", json=[_user_payload(rng) for _ in range(users)])
+    resp.raise_for_status()
+    user_ids = resp.json()["ids"]
+
+    semaphore = asyncio.Semaphore(16)
+
+    async def link(user_id: int) -> None:
+        async with semaphore:
+            callback = await client.get("/users/auth/callback", params={"code": f"code-{user_id}", "state": user_id})
+            callback.raise_for_status()
+
+    await asyncio.gather(*(link(user_id) for user_id in user_ids))
+    return user_ids
+
+
+async def drive(client: httpx.AsyncClient, user_ids: List[int], concurrency: int, duration: float,
+                seed: int) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    steps = [step for step, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def worker(worker_id: int) -> None:
+        rng = random.Random(seed * 1000 + worker_id)
+        scenario = Scenario(client, user_ids, rng)
+        while time.perf_counter() < deadline:
+            step = rng.choices(steps, weights)[0]
+            began = time.perf_counter()
+            route, resp = await step(scenario)
+            latencies[route].append(time.perf_counter() - began)
+            if resp.status_code not in OK_STATUSES:
+                errors[route] += 1
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict[str, dict]:
+    report = {}
+    for route in sorted(latencies):
+        samples = latencies[route]
+        cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+        report[route] = {
+            "requests": len(samples), "errors": errors.get(route, 0),
+            "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(cuts[49] * 1000, 2), "p95_ms": round(cuts[94] * 1000, 2),
+            "p99_ms": round(cuts[98] * 1000, 2),
+        }
+    total = sum(len(samples) for samples in latencies.values())
+    report["total"] = {"requests": total, "errors": sum(errors.values()), "rps": round(total / elapsed, 1)}
+    return report
+
+
+def print_report(report: Dict[str, dict]) -> None:
+    print(f"{'route':<38}{'reqs':>8}{'errs':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, row in report.items():
+        if route == "total":
+            continue
+        print(f"{route:<38}{row['requests']:>8}{row['errors']:>6}{row['rps']:>9}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}")
+    total = report["total"]
+    print(f"{'total':<38}{total['requests']:>8}{total['errors']:>6}{total['rps']:>9}")
+
+
+def compare(report: Dict[str, dict], baseline: Dict[str, dict], tolerance: float,
+            slack_ms: float = 50.0) -> List[str]:
+    # p95 and throughput are gated; p99 is too noisy at these sample sizes and is only reported.
+    # slack_ms keeps millisecond-level jitter on the local routes from counting as a regression.
+    regressions = []
+    for route, expected in baseline.items():
+        row = report.get(route)
+        if row is None:
+            regressions.append(f"{route}: no requests recorded")
+            continue
+        if row["rps"] < expected["rps"] * (1 - tolerance):
+            regressions.append(f"{route}: throughput {row['rps']} req/s vs baseline {expected['rps']}")
+        if "p95_ms" in expected and row["p95_ms"] > expected["p95_ms"] * (1 + tolerance) + slack_ms:
+            regressions.append(f"{route}: p95 {row['p95_ms']} ms vs baseline {expected['p95_ms']}")
+        if row["errors"] > expected["errors"] * (1 + tolerance) + 5:
+            regressions.append(f"{route}: {row['errors']} errors vs baseline {expected['errors']}")
+    return regressions
+
+
+def merge(reports: List[Dict[str, dict]], worst: bool) -> Dict[str, dict]:
+    # worst=True gives the envelope a baseline should be (slowest p95, lowest throughput over the
+    # runs); worst=False the best of each, so a regression has to show up in every run to count
+    slow, fast = (max, min) if worst else (min, max)
+    merged = {}
+    for route in sorted(set().union(*reports)):
+        rows = [report[route] for report in reports if route in report]
+        merged[route] = {}
+        for key in rows[0]:
+            pick = max if key == "requests" else fast if key == "rps" else slow
+            merged[route][key] = pick(row[key] for row in rows)
+    return merged
+
+
+async def run_once(args: argparse.Namespace) -> Dict[str, dict]:
+    servers = Servers(args.latency_ms, args.rate_limit_ratio, args.seed)
+    servers.start()
+    try:
+        await servers.wait_ready()
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=servers.app_url, limits=limits, timeout=60.0) as client:
+            user_ids = await seed_users(client, args.users, random.Random(args.seed))
+            if args.warmup:
+                await drive(client, user_ids, args.concurrency, args.warmup, args.seed + 1)
+            latencies, errors, elapsed = await drive(client, user_ids, args.concurrency, args.duration, args.seed)
+    finally:
+        servers.stop()
+
+    report = summarize(latencies, errors, elapsed)
+    print_report(report)
+    return report
+
+
+async def run(args: argparse.Namespace) -> int:
+    reports = [await run_once(args) for _ in range(args.runs)]
+    report = merge(reports, worst=args.save_baseline)
+    if args.runs > 1:
+        print(f"\n{'envelope' if args.save_baseline else 'best'} of {args.runs} runs")
+        print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline saved to {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        print(f"no baseline at {baseline_path}; run with --save-baseline to record one")
+        return 0
+
+    regressions = compare(report, json.loads(baseline_path.read_text()), args.tolerance, args.slack_ms)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"within {args.tolerance:.0%} of baseline")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--slack-ms", type=float, default=50.0)
+    parser.add_argument("--output", help="also write this run's report as JSON")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,47 @@
 import logging
+import math
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 
-from app.errors import EntityNotFoundError, BusinessRuleError, ExternalAPIError, AuthenticationError
-from app.routes import users_router, spotify_router
+from app import metrics, profiling
+from app.database import storage, user_repository, token_store
+from app.errors import EntityNotFoundError, BusinessRuleError, ExternalAPIError, AuthenticationError, \
+    UpstreamRateLimitError, PreconditionFailedError, ServiceUnavailableError
+from app.routes import users_router, spotify_router, metrics_router, stats_router
+from app import spotify
+from app.services import UserService, enrichment_service
+from app.services.user_service import SIMILARITY_INLINE_BUILD_LIMIT
 from app.settings import get_settings
 
-settings = get_settings()
-logging.basicConfig(level=settings.log_level)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Users & Spotify API", version="2.5")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    logging.basicConfig(level=settings.log_level)
+    await storage.startup()
+    UserService.rebuild_indexes()
+    if len(user_repository) > SIMILARITY_INLINE_BUILD_LIMIT:
+        UserService.start_similarity_build()
+    # the Spotify client itself opens on first use; only its background jobs start here
+    if settings.spotify_configured:
+        await spotify.tokens.startup()
+        await enrichment_service.startup()
+    yield
+    await enrichment_service.shutdown()
+    await UserService.stop_similarity_build()
+    if spotify.is_loaded("tokens"):
+        await spotify.tokens.shutdown()
+    if spotify.is_loaded("pool"):
+        await spotify.pool.shutdown()
+    await storage.shutdown()
+
+
+app = FastAPI(title="Users & Spotify API", version="2.5", lifespan=lifespan)
 
 
 @app.exception_handler(EntityNotFoundError)
@@ -31,6 +60,14 @@ async def business_rule_handler(request: Request, exc: BusinessRuleError):
     )
 
 
+@app.exception_handler(PreconditionFailedError)
+async def precondition_failed_handler(request: Request, exc: PreconditionFailedError):
+    return JSONResponse(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        content={"error": "Precondition Failed", "message": exc.message}
+    )
+
+
 @app.exception_handler(AuthenticationError)
 async def auth_error_handler(request: Request, exc: AuthenticationError):
     return JSONResponse(
@@ -48,6 +85,31 @@ async def external_api_handler(request: Request, exc: ExternalAPIError):
     )
 
 
+@app.exception_handler(UpstreamRateLimitError)
+async def upstream_rate_limit_handler(request: Request, exc: UpstreamRateLimitError):
+    logger.warning(f"Upstream rate limit: {exc.message}")
+    headers = {}
+    if exc.retry_after is not None:
+        headers["Retry-After"] = str(math.ceil(exc.retry_after))
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"error": "Service Unavailable", "message": exc.message},
+        headers=headers
+    )
+
+
+@app.exception_handler(ServiceUnavailableError)
+async def service_unavailable_handler(request: Request, exc: ServiceUnavailableError):
+    headers = {}
+    if exc.retry_after is not None:
+        headers["Retry-After"] = str(math.ceil(exc.retry_after))
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"error": "Service Unavailable", "message": exc.message},
+        headers=headers
+    )
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     errors = []
@@ -70,7 +132,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # pagination and caching headers browsers would otherwise hide from cross-origin callers
+    expose_headers=["X-Next-Cursor", "Link", "ETag"],
 )
 
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# added last so it wraps everything else and also times CORS preflights
+app.add_middleware(metrics.MetricsMiddleware)
+
+for name, documentation, size in [
+    ("app_users_stored", "Users in the user repository", lambda: len(user_repository)),
+    ("app_tokens_stored", "Spotify tokens in the token store", lambda: len(token_store)),
+    ("app_user_locks", "Per-user write locks currently held or waited on", lambda: len(UserService.user_locks)),
+    # write-behind storage only (SQLite); always 0 in memory
+    ("app_storage_pending_writes", "Writes acknowledged but not yet persisted",
+     lambda: storage.stats().get("pending", 0)),
+    ("app_storage_failed_writes", "Writes that could not be persisted after retrying",
+     lambda: storage.stats().get("failed_writes", 0)),
+]:
+    metrics.registry.register(metrics.CallbackGauge(name, documentation, size))
+
 app.include_router(users_router)
 app.include_router(spotify_router)
+app.include_router(stats_router)
+app.include_router(metrics_router)
@@ -1,7 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
 
-from app.database.memory import fake_db, token_store
+from app.database import user_repository, token_store
+from app.services import UserService
 from main import app
 
 
@@ -13,8 +14,9 @@ def client():
 
 @pytest.fixture(autouse=True)
 def reset_db():
-    fake_db.clear()
+    user_repository.clear()
     token_store.clear()
+    UserService.rebuild_indexes()
     yield
 
 
@@ -0,0 +1,10 @@
+import time
+
+from app.models import SpotifyToken
+
+
+def make_token(access_token: str, age_seconds: float = 0, expires_in: int = 3600) -> SpotifyToken:
+    return SpotifyToken(
+        access_token=access_token, token_type="Bearer", expires_in=expires_in,
+        refresh_token="refresh", scope="user-follow-read", created_at=time.time() - age_seconds
+    )
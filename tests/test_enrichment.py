@@ -0,0 +1,70 @@
+from unittest.mock import patch, AsyncMock
+
+import pytest
+
+from app.models import UserCreate, SpotifyArtist, SpotifyTrack
+from app.services import UserService, EnrichmentService
+
+
+def artist(artist_id: str) -> SpotifyArtist:
+    return SpotifyArtist(id=artist_id, name=f"Artist {artist_id}", href="h", uri="u")
+
+
+class TestEnrichment:
+
+    @pytest.fixture(autouse=True)
+    def reset_enrichment(self):
+        EnrichmentService.reset()
+        yield
+        EnrichmentService.reset()
+
+    @pytest.mark.asyncio
+    async def test_fetches_in_chunks_of_50_and_updates_every_copy(self):
+        first = UserService.create_user(UserCreate(name="Ana", age=30))
+        second = UserService.create_user(UserCreate(name="Luis", age=40))
+        for index in range(60):
+            UserService.add_favorite_artist(first.id, artist(f"a{index}"))
+        UserService.add_favorite_artist(second.id, artist("a0"))
+        UserService.add_favorite_track(second.id, SpotifyTrack(
+            id="t1", name="Song", duration_ms=1, explicit=False, artists=[artist("a0")],
+            album_name="Album", href="h", uri="u"
+        ))
+
+        async def several_artists(token, ids):
+            return [{"id": i, "popularity": 70, "genres": ["rock"]} for i in ids]
+
+        async def several_tracks(token, ids):
+            return [{"id": i, "popularity": 55} for i in ids]
+
+        with patch("app.spotify.tokens.ensure_app_token", new=AsyncMock(return_value="app")), \
+                patch("app.spotify.client.get_several_artists", side_effect=several_artists) as mock_artists, \
+                patch("app.spotify.client.get_several_tracks", side_effect=several_tracks) as mock_tracks:
+            summary = await EnrichmentService.run_once()
+            second_pass = await EnrichmentService.run_once()
+
+        assert mock_artists.await_count == 2
+        assert mock_tracks.await_count == 1
+        assert summary == {"artists": 60, "tracks": 1, "users": 2}
+        assert second_pass["artists"] == 0
+        assert first.favorite_artists[59].genres == ["rock"]
+        assert second.favorite_artists[0].popularity == 70
+        assert second.favorite_tracks[0].popularity == 55
+        assert second.favorite_tracks[0].artists[0].genres == ["rock"]
+
+    @pytest.mark.asyncio
+    async def test_items_no_longer_favorited_are_forgotten(self):
+        user = UserService.create_user(UserCreate(name="Ana", age=30))
+        UserService.add_favorite_artist(user.id, artist("a1"))
+        UserService.add_favorite_artist(user.id, artist("a2"))
+
+        async def several_artists(token, ids):
+            return [{"id": i, "popularity": 70, "genres": []} for i in ids]
+
+        with patch("app.spotify.tokens.ensure_app_token", new=AsyncMock(return_value="app")), \
+                patch("app.spotify.client.get_several_artists", side_effect=several_artists), \
+                patch("app.spotify.client.get_several_tracks", new=AsyncMock(return_value=[])):
+            await EnrichmentService.run_once()
+            UserService.remove_favorite_artist(user.id, "a2")
+            await EnrichmentService.run_once()
+
+        assert set(EnrichmentService._enriched_at) == {("artist", "a1")}
@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app import metrics
+from app.database import token_store
+from app.spotify import pool, tokens
+from tests.helpers import make_token
+
+
+class TestMetricTypes:
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram("demo_seconds", "Demo", ("route",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.5, "/a")
+        histogram.observe(5.0, "/a")
+
+        lines = histogram.samples()
+
+        assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in lines
+        assert 'demo_seconds_bucket{route="/a",le="1"} 2' in lines
+        assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'demo_seconds_count{route="/a"} 3' in lines
+
+    def test_label_values_are_escaped(self):
+        counter = metrics.Counter("demo_total", "Demo", ("path",))
+        counter.inc('a"b\\c')
+        assert counter.samples() == ['demo_total{path="a\\"b\\\\c"} 1']
+
+
+class TestMetricsEndpoint:
+
+    def test_requests_are_labelled_by_route_template(self, client, created_user):
+        labels = ("GET", "/users/{user_id}", "200")
+        before = metrics.http_requests.value(*labels)
+
+        client.get(f"/users/{created_user['id']}")
+        client.get(f"/users/{created_user['id']}")
+
+        assert metrics.http_requests.value(*labels) == before + 2
+        body = client.get("/metrics")
+        assert body.headers["content-type"].startswith("text/plain")
+        assert 'http_request_duration_seconds_count{method="GET",route="/users/{user_id}",status="200"}' in body.text
+        assert "app_users_stored 1" in body.text
+        assert "http_requests_in_flight 1" in body.text
+
+    def test_unknown_paths_share_one_series(self, client):
+        before = metrics.http_requests.value("GET", metrics.UNMATCHED_ROUTE, "404")
+        client.get("/nope/1")
+        client.get("/nope/2")
+        assert metrics.http_requests.value("GET", metrics.UNMATCHED_ROUTE, "404") == before + 2
+
+
+class TestUpstreamMetrics:
+
+    @pytest.mark.asyncio
+    async def test_transport_records_spotify_latency_and_status(self):
+        def handler(request):
+            return httpx.Response(429)
+
+        with patch("httpx.AsyncHTTPTransport.handle_async_request", side_effect=httpx.MockTransport(handler)
+                   .handle_async_request):
+            before = metrics.spotify_requests.value("GET", "/v1/search", "429")
+            samples = metrics.spotify_request_duration.count("GET", "/v1/search")
+            transport = pool._MeteredTransport()
+            await transport.handle_async_request(httpx.Request("GET", "https://api.spotify.com/v1/search?q=x"))
+
+        assert metrics.spotify_requests.value("GET", "/v1/search", "429") == before + 1
+        assert metrics.spotify_request_duration.count("GET", "/v1/search") == samples + 1
+
+    @pytest.mark.asyncio
+    async def test_token_refresh_outcomes_are_counted(self):
+        token_store[1] = make_token("old", age_seconds=4000)
+        rejected = metrics.token_refreshes.value("user", "rejected")
+
+        with patch("app.spotify.tokens.refresh_token_with_refresh_token", return_value=None):
+            assert await tokens.ensure_valid_token(1) is None
+
+        assert metrics.token_refreshes.value("user", "rejected") == rejected + 1
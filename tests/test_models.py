@@ -2,6 +2,7 @@ import pytest
 from pydantic import ValidationError
 
 from app.models.user import UserCreate
+from app.spotify.payloads import decode_artists, decode_tracks
 
 
 class TestUserModels:
@@ -28,3 +29,22 @@ class TestUserModels:
         assert len(user.music_preferences) == 2
         assert "Rock" in user.music_preferences
         assert "Jazz" in user.music_preferences
+
+
+class TestSpotifyPayloads:
+
+    def test_track_search_decodes_spotify_shape(self):
+        body = (b'{"tracks": {"items": [null, {"id": "1", "name": "Song", "duration_ms": 1000, "explicit": true,'
+                b' "album": {"name": "Album", "id": "a"}, "artists": [{"id": "2", "name": "Band",'
+                b' "href": "h", "uri": "u"}], "href": "h", "uri": "u", "disc_number": 1}]}}')
+
+        tracks = decode_tracks(body)
+
+        assert len(tracks) == 1
+        assert tracks[0].album_name == "Album"
+        assert tracks[0].artists[0].genres == []
+        assert "album_name" in tracks[0].model_dump()
+
+    def test_artist_search_rejects_unexpected_shape(self):
+        with pytest.raises(ValidationError):
+            decode_artists(b'{"tracks": {"items": []}}')
@@ -0,0 +1,90 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import profiling
+from app.models import SpotifyArtist
+from main import app as main_app
+
+ARTIST = SpotifyArtist(id="a1", name="Band", href="h", uri="u")
+
+
+def _timing_names(header: str):
+    return [part.split(";")[0] for part in header.split(", ")]
+
+
+class TestServerTiming:
+
+    def test_requests_without_the_header_are_not_profiled(self, client, created_user):
+        response = client.get(f"/users/{created_user['id']}")
+        assert "server-timing" not in response.headers
+
+    def test_header_is_ignored_unless_enabled(self, client, created_user):
+        response = client.get(f"/users/{created_user['id']}", headers={"X-Profile": "1"})
+        assert "server-timing" not in response.headers
+
+    @patch("app.services.SpotifyService.find_artist_to_save")
+    def test_favorite_route_reports_its_spans(self, mock_find, client, created_user):
+        async def find(user_id, query):
+            with profiling.span("spotify"):
+                await asyncio.sleep(0.01)
+            return ARTIST
+
+        mock_find.side_effect = find
+
+        profiled = TestClient(profiling.ProfilingMiddleware(main_app, header_enabled=True))
+        response = profiled.post(f"/users/{created_user['id']}/favorites/artists?artist_name=Band",
+                                 headers={"X-Profile": "1"})
+
+        assert response.status_code == 200
+        names = _timing_names(response.headers["server-timing"])
+        assert names == ["validate", "spotify", "save", "serialize", "total"]
+        spotify = response.headers["server-timing"].split(", ")[1]
+        assert float(spotify.split("dur=")[1]) >= 10
+
+    def test_cprofile_dump_is_written_per_request(self, tmp_path):
+        app = FastAPI()
+
+        @app.get("/work")
+        async def work():
+            with profiling.span("work"):
+                sum(range(1000))
+            return {"ok": True}
+
+        app.add_middleware(profiling.ProfilingMiddleware, header_enabled=True, dump_dir=str(tmp_path))
+
+        with TestClient(app) as local:
+            profiled = local.get("/work", headers={"X-Profile": "cprofile"})
+            plain = local.get("/work", headers={"X-Profile": "0"})
+
+        assert _timing_names(profiled.headers["server-timing"]) == ["work", "total"]
+        assert "server-timing" not in plain.headers
+        assert len(list(tmp_path.glob("*-GET-work.prof"))) == 1
+
+
+class TestSpans:
+
+    def test_spans_are_no_ops_outside_a_profiled_request(self):
+        with profiling.span("anything"):
+            pass
+        profiling.record("anything", 1.0)
+        assert profiling._current.get() is None
+
+    @pytest.mark.asyncio
+    async def test_gathered_tasks_record_into_the_request_profile(self):
+        profile = profiling.Profile()
+        token = profiling._current.set(profile)
+        try:
+            async def lookup():
+                with profiling.span("lookup"):
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(lookup(), lookup(), lookup())
+        finally:
+            profiling._current.reset(token)
+
+        assert profile.spans["lookup"][1] == 3
+        assert 'lookup;dur=' in profile.server_timing(0.01)
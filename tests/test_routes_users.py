@@ -1,3 +1,14 @@
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.models import SpotifyArtist
+from app.services import UserService
+from main import app
+
+
 def test_create_user_success(client, sample_user_payload):
     response = client.post("/users/", json=sample_user_payload)
     assert response.status_code == 201
@@ -40,3 +51,230 @@ def test_delete_user(client, created_user):
 
     get_response = client.get(f"/users/{user_id}")
     assert get_response.status_code == 404
+
+
+def test_ids_are_not_reused_after_delete(client, sample_user_payload):
+    first = client.post("/users/", json=sample_user_payload).json()
+    second = client.post("/users/", json=sample_user_payload).json()
+
+    client.delete(f"/users/{first['id']}")
+    third = client.post("/users/", json=sample_user_payload).json()
+
+    assert third["id"] == second["id"] + 1
+    assert client.get(f"/users/{second['id']}").status_code == 200
+
+
+def test_delete_unknown_user_returns_404(client):
+    response = client.delete("/users/999")
+    assert response.status_code == 404
+
+
+def test_list_users_paginates_with_cursor(client, sample_user_payload):
+    for _ in range(5):
+        client.post("/users/", json=sample_user_payload)
+
+    first = client.get("/users/?limit=2")
+    assert [u["id"] for u in first.json()] == [1, 2]
+    assert first.headers["X-Next-Cursor"] == "2"
+
+    second = client.get(f"/users/?limit=2&after={first.headers['X-Next-Cursor']}")
+    assert [u["id"] for u in second.json()] == [3, 4]
+
+    last = client.get("/users/?limit=2&after=4")
+    assert [u["id"] for u in last.json()] == [5]
+    assert "X-Next-Cursor" not in last.headers
+
+
+def test_list_users_cursor_skips_deleted_ids(client, sample_user_payload):
+    for _ in range(6):
+        client.post("/users/", json=sample_user_payload)
+    for user_id in (2, 3, 4):
+        client.delete(f"/users/{user_id}")
+
+    page = client.get("/users/?limit=2&after=1", headers={"Origin": "https://example.com"})
+
+    assert [u["id"] for u in page.json()] == [5, 6]
+    exposed = page.headers["Access-Control-Expose-Headers"]
+    assert all(name in exposed for name in ("X-Next-Cursor", "Link", "ETag"))
+
+
+def test_list_users_streams_ndjson(client, sample_user_payload):
+    for _ in range(3):
+        client.post("/users/", json=sample_user_payload)
+    client.delete("/users/2")
+
+    response = client.get("/users/", headers={"Accept": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [u["id"] for u in lines] == [1, 3]
+
+
+def test_bulk_create_reports_row_errors_without_aborting(client, sample_user_payload):
+    rows = [sample_user_payload, {"name": "Kid", "age": 10}, {**sample_user_payload, "name": "another user"}]
+
+    response = client.post("/users/bulk", json=rows)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert data["ids"] == [1, 2]
+    assert data["errors"] == [{"index": 1, "errors": ["age: Input should be greater than 18"]}]
+    assert client.get("/users/2").json()["name"] == "Another User"
+
+
+def test_bulk_create_accepts_ndjson(client, sample_user_payload):
+    lines = [json.dumps(sample_user_payload), "not json", json.dumps({**sample_user_payload, "age": 40})]
+
+    response = client.post(
+        "/users/bulk", content="\n".join(lines) + "\n", headers={"Content-Type": "application/x-ndjson"}
+    )
+
+    data = response.json()
+    assert data["received"] == 3
+    assert data["created"] == 2
+    assert data["errors"][0]["index"] == 1
+
+
+def test_bulk_ndjson_line_with_several_objects_is_one_bad_row(client):
+    body = ('{"name":"Ann Lee","age":30}, {"name":"Bob Ray","age":40}\n'
+            '{"name":"Cy Dee","age":33}\n')
+
+    response = client.post("/users/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    data = response.json()
+    assert (data["received"], data["created"], data["failed"]) == (2, 1, 1)
+    assert data["errors"][0]["index"] == 0
+    assert client.get("/users/1").json()["name"] == "Cy Dee"
+
+
+def test_get_user_honours_if_none_match(client, created_user):
+    user_id = created_user["id"]
+    etag = client.get(f"/users/{user_id}").headers["etag"]
+
+    cached = client.get(f"/users/{user_id}", headers={"If-None-Match": f"W/{etag}"})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    client.put(f"/users/{user_id}", json={"name": "Other Name", "age": 40})
+    changed = client.get(f"/users/{user_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_favorite_changes_bump_user_etag(client, created_user):
+    user_id = created_user["id"]
+    etag = client.get(f"/users/{user_id}").headers["etag"]
+    UserService.add_favorite_artist(user_id, SpotifyArtist(id="a1", name="Band", href="h", uri="u"))
+    after_add = client.get(f"/users/{user_id}", headers={"If-None-Match": etag})
+    assert after_add.status_code == 200
+
+    UserService.remove_favorite_artist(user_id, "a1")
+    after_remove = client.get(f"/users/{user_id}", headers={"If-None-Match": after_add.headers["etag"]})
+    assert after_remove.status_code == 200
+
+
+def test_list_users_collection_etag(client, sample_user_payload):
+    client.post("/users/", json=sample_user_payload)
+    etag = client.get("/users/").headers["etag"]
+
+    assert client.get("/users/", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/users/", json=sample_user_payload)
+    assert client.get("/users/", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_list_users_pages_have_their_own_etag_and_vary_on_accept(client, sample_user_payload):
+    for _ in range(3):
+        client.post("/users/", json=sample_user_payload)
+
+    first = client.get("/users/?limit=2")
+    second = client.get("/users/?limit=2&after=2")
+    assert first.headers["etag"] != second.headers["etag"]
+    assert client.get("/users/?limit=2&after=2", headers={"If-None-Match": first.headers["etag"]}).status_code == 200
+
+    cached = client.get("/users/?limit=2", headers={"If-None-Match": first.headers["etag"]})
+    ndjson = client.get("/users/", headers={"Accept": "application/x-ndjson", "Origin": "https://example.com"})
+    for response in (first, cached, ndjson):
+        assert "Accept" in response.headers["vary"]
+    assert cached.status_code == 304
+
+
+def _create_people(client):
+    people = [("Ana Lopez", 25, ["Rock", "Pop"]), ("Anabel Ruiz", 34, ["rock"]), ("Andres Gil", 40, ["Rock"]),
+              ("Luis Ana", 30, ["Rock", "Jazz"]), ("Marta Ana", 28, ["Pop"])]
+    for name, age, genres in people:
+        client.post("/users/", json={"name": name, "age": age, "music_preferences": genres})
+
+
+def test_search_users_combines_filters(client):
+    _create_people(client)
+
+    response = client.get("/users/search?genre=ROCK&min_age=25&max_age=35")
+    assert response.status_code == 200
+    assert [u["name"] for u in response.json()] == ["Ana Lopez", "Anabel Ruiz", "Luis Ana"]
+
+    assert [u["id"] for u in client.get("/users/search?name=ana").json()] == [1, 2]
+    assert [u["id"] for u in client.get("/users/search?genre=rock&genre=pop").json()] == [1]
+    assert client.get("/users/search?genre=Blues&name=ana").json() == []
+    assert client.get("/users/search?min_age=40&max_age=30").status_code == 400
+
+
+def test_search_users_rejects_a_blank_name(client):
+    _create_people(client)
+
+    assert client.get("/users/search?name=%20%20").status_code == 400
+    assert [u["id"] for u in client.get("/users/search?name=%20ana").json()] == [1, 2]
+
+
+def test_search_users_paginates_with_cursor(client):
+    _create_people(client)
+
+    first = client.get("/users/search?genre=rock&limit=2")
+    assert [u["id"] for u in first.json()] == [1, 2]
+    assert first.headers["X-Next-Cursor"] == "2"
+
+    second = client.get("/users/search?genre=rock&limit=2&after=2")
+    assert [u["id"] for u in second.json()] == [3, 4]
+
+
+def test_search_indexes_follow_updates_and_deletes(client):
+    _create_people(client)
+    client.put("/users/1", json={"name": "Zoe Lopez", "age": 50, "music_preferences": ["Jazz"]})
+    client.delete("/users/2")
+
+    assert client.get("/users/search?name=ana").json() == []
+    assert [u["id"] for u in client.get("/users/search?genre=jazz&min_age=45").json()] == [1]
+    assert [u["id"] for u in client.get("/users/search?genre=rock").json()] == [3, 4]
+
+
+def test_similar_users_ranked_by_overlap(client):
+    _create_people(client)
+    UserService.add_favorite_artist(1, SpotifyArtist(id="a1", name="Band", href="h", uri="u"))
+    UserService.add_favorite_artist(5, SpotifyArtist(id="a1", name="Band", href="h", uri="u"))
+
+    response = client.get("/users/1/similar?k=3")
+    assert response.status_code == 200
+    ranked = [(item["user"]["id"], item["similarity"]) for item in response.json()]
+    assert ranked == [(5, 0.6667), (2, 0.3333), (3, 0.3333)]
+
+    client.put("/users/5", json={"name": "Marta Ana", "age": 28, "music_preferences": ["Blues"]})
+    assert [item["user"]["id"] for item in client.get("/users/1/similar?k=1").json()] == [2]
+    assert client.get("/users/99/similar").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_similar_users_answers_503_while_index_builds_off_the_loop():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        for name in ("Ana Lopez", "Luis Gil", "Eva Ruiz"):
+            await client.post("/users/", json={"name": name, "age": 30, "music_preferences": ["Rock"]})
+
+        with patch("app.services.user_service.SIMILARITY_INLINE_BUILD_LIMIT", 2):
+            pending = await client.get("/users/1/similar")
+            assert pending.status_code == 503
+            assert pending.headers["Retry-After"] == "1"
+
+            await UserService._similarity_build
+            ready = await client.get("/users/1/similar")
+        assert [item["user"]["id"] for item in ready.json()] == [2, 3]
@@ -0,0 +1,64 @@
+from app.indexes import SimilarityIndex
+from app.models import User, SpotifyArtist
+
+
+def _user(user_id: int, genres, artist_ids=()) -> User:
+    artists = [SpotifyArtist(id=artist_id, name=artist_id, href="h", uri="u") for artist_id in artist_ids]
+    return User.model_construct(id=user_id, name=f"User {user_id}", age=30, music_preferences=list(genres),
+                                favorite_artists=artists, favorite_tracks=[])
+
+
+class TestSimilarityIndex:
+
+    def test_lsh_finds_near_duplicates_without_scanning(self):
+        index = SimilarityIndex(exact_below=0)
+        artists = [f"a{i}" for i in range(10)]
+        users = [_user(1, ["Rock"], artists), _user(2, ["Rock"], artists[:9])]
+        # unrelated users that share no item with user 1
+        users += [_user(user_id, ["Jazz"], [f"x{user_id}"]) for user_id in range(3, 500)]
+        index.ensure_built(users)
+
+        assert index._candidates(1) != index._items.keys()
+        assert index.similar(1, 3) == [(2, 10 / 11)]
+
+    def test_hooks_are_ignored_until_built_then_kept_in_sync(self):
+        index = SimilarityIndex()
+        first, second = _user(1, ["Rock"]), _user(2, ["Rock", "Pop"])
+        index.add_user(first)
+        assert len(index) == 0
+
+        index.ensure_built([first])
+        index.add_user(second)
+        assert index.similar(1, 5) == [(2, 0.5)]
+
+        index.remove_user(second)
+        assert index.similar(1, 5) == []
+        index.clear()
+        assert len(index) == 0
+
+    def test_changes_during_a_background_build_are_replayed(self):
+        index = SimilarityIndex()
+        users = {1: _user(1, ["Rock"]), 2: _user(2, ["Rock", "Pop"]), 3: _user(3, ["Jazz"])}
+        generation = index.begin_build()
+        tables = index.compute(list(users.values()))
+
+        # meanwhile: user 3 changes genre, user 2 is deleted, user 4 is created
+        users[3] = _user(3, ["Rock"])
+        index.update_user(users[3], users[3])
+        index.remove_user(users.pop(2))
+        users[4] = _user(4, ["Rock", "Pop"])
+        index.add_user(users[4])
+        assert not index.built
+
+        index.finish_build(generation, tables, users.get)
+        assert index.built and not index.building
+        assert index.similar(1, 5) == [(3, 1.0), (4, 0.5)]
+
+    def test_build_finishing_after_a_clear_is_discarded(self):
+        index = SimilarityIndex()
+        generation = index.begin_build()
+        tables = index.compute([_user(1, ["Rock"])])
+        index.clear()
+
+        index.finish_build(generation, tables, lambda user_id: None)
+        assert not index.built and len(index) == 0
@@ -0,0 +1,209 @@
+import asyncio
+import gzip
+import json
+from unittest.mock import patch, AsyncMock
+
+import httpx
+import pytest
+
+from app.database import token_store
+from app.spotify import client as spotify_client
+from app.spotify.cache import TTLCache
+from tests.helpers import make_token
+
+SEARCH_PAYLOAD = {"artists": {"items": [{"id": "1", "name": "Band"}]}}
+SEARCH_BODY = json.dumps(SEARCH_PAYLOAD).encode()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+        cache.set("k", "v")
+
+        clock.now = 4.9
+        assert cache.get("k") == "v"
+        clock.now = 5.0
+        assert cache.get("k") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+
+class TestSearchCache:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        spotify_client.get_search_cache().clear()
+        yield
+        spotify_client.get_search_cache().clear()
+
+    @pytest.mark.asyncio
+    async def test_equivalent_queries_share_one_upstream_call(self):
+        token_store[1] = make_token("a")
+        token_store[2] = make_token("b")
+
+        with patch("app.spotify.client._spotify_get_raw", new=AsyncMock(return_value=SEARCH_BODY)) as mock_get:
+            first = await spotify_client.search_artist(1, "Daft  Punk", limit=10)
+            second = await spotify_client.search_artist(2, " daft punk ", limit=10)
+
+        assert first == second == SEARCH_PAYLOAD
+        mock_get.assert_awaited_once()
+        assert mock_get.await_args.kwargs["params"]["q"] == "daft punk"
+
+    @pytest.mark.asyncio
+    async def test_errors_are_not_cached(self):
+        token_store[1] = make_token("a")
+
+        with patch("app.spotify.client._spotify_get_raw",
+                   new=AsyncMock(return_value={"error": "token_expired_or_invalid"})) as mock_get:
+            await spotify_client.search_track(1, "song")
+            await spotify_client.search_track(1, "song")
+
+        assert mock_get.await_count == 2
+
+    def test_search_route_sets_cache_control(self, client, created_user):
+        with patch("app.services.SpotifyService.search_artists_raw", new=AsyncMock(return_value=SEARCH_BODY)):
+            response = client.get(f"/spotify/search/artist?user_id={created_user['id']}&q=band")
+
+        assert response.status_code == 200
+        assert response.content == SEARCH_BODY
+        assert response.headers["Cache-Control"] == "public, max-age=300"
+
+    def test_search_route_maps_missing_token_to_401(self, client, created_user):
+        with patch("app.services.SpotifyService.search_tracks_raw",
+                   new=AsyncMock(return_value={"error": "no_valid_token"})):
+            response = client.get(f"/spotify/search/track?user_id={created_user['id']}&q=song")
+
+        assert response.status_code == 401
+
+
+class TestRequestCoalescing:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        spotify_client.get_search_cache().clear()
+        yield
+        spotify_client.get_search_cache().clear()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_searches_share_one_upstream_call(self):
+        for user_id in range(1, 6):
+            token_store[user_id] = make_token(f"token-{user_id}")
+
+        async def slow_get(access_token, path, params=None):
+            await asyncio.sleep(0.01)
+            return SEARCH_BODY
+
+        with patch("app.spotify.client._spotify_get_raw", side_effect=slow_get) as mock_get:
+            results = await asyncio.gather(
+                *(spotify_client.search_track(user_id, "Trending Song") for user_id in range(1, 6))
+            )
+
+        assert mock_get.await_count == 1
+        assert all(result == SEARCH_PAYLOAD for result in results)
+
+    @pytest.mark.asyncio
+    async def test_followers_retry_with_own_token_when_leader_is_rejected(self):
+        token_store[1] = make_token("revoked")
+        token_store[2] = make_token("valid")
+
+        async def fake_get(access_token, path, params=None):
+            await asyncio.sleep(0.01)
+            if access_token == "revoked":
+                return {"error": "token_expired_or_invalid"}
+            return SEARCH_BODY
+
+        with patch("app.spotify.client._spotify_get_raw", side_effect=fake_get):
+            leader, follower = await asyncio.gather(
+                spotify_client.search_track(1, "song"),
+                spotify_client.search_track(2, "song")
+            )
+
+        assert "error" in leader
+        assert follower == SEARCH_PAYLOAD
+
+
+class TestSearchPassthroughStream:
+
+    def test_stream_mode_relays_upstream_bytes(self, client, created_user):
+        token_store[created_user["id"]] = make_token("access")
+
+        async def chunks():
+            yield SEARCH_BODY[:10]
+            yield SEARCH_BODY[10:]
+
+        upstream = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=chunks(), headers={"Content-Type": "application/json"})
+        ))
+
+        with patch("app.spotify.pool.get_client", return_value=upstream):
+            response = client.get(f"/spotify/search/artist?user_id={created_user['id']}&q=band&stream=true")
+
+        assert response.status_code == 200
+        assert response.content == SEARCH_BODY
+        assert len(spotify_client.get_search_cache()) == 0
+
+    def test_stream_mode_only_relays_gzip_to_callers_that_accept_it(self, client, created_user):
+        token_store[created_user["id"]] = make_token("access")
+        async def compressed():
+            yield gzip.compress(SEARCH_BODY)
+
+        upstream = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, content=compressed(),
+                                           headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+        ))
+        url = f"/spotify/search/artist?user_id={created_user['id']}&q=band&stream=true"
+
+        with patch("app.spotify.pool.get_client", return_value=upstream):
+            identity = client.get(url, headers={"Accept-Encoding": "identity"})
+            refused = client.get(url, headers={"Accept-Encoding": "gzip;q=0, *"})
+            accepted = client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+
+        for response in (identity, refused):
+            assert "content-encoding" not in response.headers
+            assert response.content == SEARCH_BODY
+        assert accepted.headers["content-encoding"] == "gzip"
+        assert accepted.content == SEARCH_BODY
+
+    def test_upstream_is_closed_when_the_stream_fails_midway(self, client, created_user):
+        token_store[created_user["id"]] = make_token("access")
+
+        class FailingStream(httpx.AsyncByteStream):
+            closed = False
+
+            async def __aiter__(self):
+                yield SEARCH_BODY[:10]
+                raise httpx.ReadError("connection reset")
+
+            async def aclose(self):
+                FailingStream.closed = True
+
+        upstream = httpx.AsyncClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, stream=FailingStream(), headers={"Content-Type": "application/json"})
+        ))
+
+        with patch("app.spotify.pool.get_client", return_value=upstream):
+            with pytest.raises(httpx.ReadError):
+                client.get(f"/spotify/search/artist?user_id={created_user['id']}&q=band&stream=true")
+
+        assert FailingStream.closed
@@ -0,0 +1,109 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.database import token_store
+from app.spotify import client as spotify_client
+from tests.helpers import make_token
+
+IDS = [f"artist{i}" for i in range(120)]
+
+
+class TestFollowChunking:
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        spotify_client.get_follow_cache().clear()
+        token_store[1] = make_token("access")
+        yield
+        spotify_client.get_follow_cache().clear()
+
+    @pytest.mark.asyncio
+    async def test_follow_check_is_chunked_merged_in_order_and_cached(self):
+        async def contains(access_token, path, params=None):
+            return [int(i[len("artist"):]) % 2 == 0 for i in params["ids"].split(",")]
+
+        with patch("app.spotify.client._spotify_get", side_effect=contains) as mock_get:
+            first = await spotify_client.check_following_status(1, IDS, "artist")
+            second = await spotify_client.check_following_status(1, IDS, "artist")
+
+        assert first == second == [i % 2 == 0 for i in range(120)]
+        assert mock_get.await_count == 3
+        assert all(len(call.kwargs["params"]["ids"].split(",")) <= 50 for call in mock_get.await_args_list)
+
+    @pytest.mark.asyncio
+    async def test_follow_is_chunked_and_updates_cache(self):
+        async def put(access_token, path, params=None, json_body=None):
+            return True
+
+        with patch("app.spotify.client._spotify_put", side_effect=put) as mock_put, \
+                patch("app.spotify.client._spotify_get") as mock_get:
+            result = await spotify_client.follow_ids(1, IDS, "artist")
+            status = await spotify_client.check_following_status(1, IDS[:3], "artist")
+
+        assert result == {"success": True}
+        assert [len(call.kwargs["json_body"]["ids"]) for call in mock_put.await_args_list] == [50, 50, 20]
+        assert status == [True, True, True]
+        mock_get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_rejected_follow_is_reported_and_not_cached(self):
+        async def put(access_token, path, params=None, json_body=None):
+            return json_body["ids"][0] != "artist50"  # 401 on the second chunk
+
+        async def contains(access_token, path, params=None):
+            return [False] * len(params["ids"].split(","))
+
+        with patch("app.spotify.client._spotify_put", side_effect=put), \
+                patch("app.spotify.client._spotify_get", side_effect=contains) as mock_get:
+            result = await spotify_client.follow_ids(1, IDS, "artist")
+            status = await spotify_client.check_following_status(1, IDS[:3], "artist")
+
+        assert result == {"error": "token_expired_or_invalid"}
+        assert status == [False, False, False]
+        mock_get.assert_awaited_once()
+
+
+def followed_page(start: int, count: int, has_more: bool):
+    return {"artists": {
+        "items": [{"id": f"a{i}", "name": f"Artist {i}"} for i in range(start, start + count)],
+        "cursors": {"after": f"a{start + count - 1}" if has_more else None}
+    }}
+
+
+class TestFollowedArtistsStreaming:
+
+    @patch("app.spotify.client.get_followed_artists")
+    def test_walks_every_page(self, mock_get, client, created_user):
+        mock_get.side_effect = [followed_page(0, 50, True), followed_page(50, 30, False)]
+
+        response = client.get(f"/spotify/me/following/artists?user_id={created_user['id']}")
+
+        assert response.json()["count"] == 80
+        assert mock_get.call_args_list[1].kwargs == {"limit": 50, "after": "a49"}
+
+    @patch("app.spotify.client.get_followed_artists")
+    def test_streams_ndjson_and_honors_max_items(self, mock_get, client, created_user):
+        mock_get.side_effect = [followed_page(0, 50, True), followed_page(50, 10, True)]
+
+        response = client.get(
+            f"/spotify/me/following/artists?user_id={created_user['id']}&max_items=60",
+            headers={"Accept": "application/x-ndjson"}
+        )
+
+        lines = response.text.splitlines()
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert len(lines) == 60
+        assert mock_get.call_count == 2
+        assert mock_get.call_args_list[1].kwargs["limit"] == 10
+
+    @patch("app.spotify.client.get_followed_artists")
+    def test_stream_without_token_is_unauthorized(self, mock_get, client, created_user):
+        mock_get.return_value = {"error": "no_valid_token"}
+
+        response = client.get(
+            f"/spotify/me/following/artists?user_id={created_user['id']}",
+            headers={"Accept": "application/x-ndjson"}
+        )
+
+        assert response.status_code == 401
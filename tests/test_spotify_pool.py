@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+
+from app.spotify import pool
+from main import app
+
+
+class TestSpotifyPool:
+
+    def test_lifespan_closes_shared_client(self):
+        with TestClient(app):
+            shared = pool.get_client()
+            assert not shared.is_closed
+            assert pool.get_client() is shared
+
+        assert shared.is_closed
+
+    def test_stats_endpoint_reports_pool(self, client):
+        response = client.get("/spotify/stats")
+
+        assert response.status_code == 200
+        data = response.json()["pool"]
+        # opened on first use, not at startup
+        assert data["open"] is False
+        assert data["max_connections"] == 100
+        assert data["connections"] == 0
+
+        pool.get_client()
+        assert client.get("/spotify/stats").json()["pool"]["open"] is True
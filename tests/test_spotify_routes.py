@@ -1,3 +1,5 @@
+import asyncio
+import json
 from unittest.mock import patch
 
 from app.errors import AuthenticationError, EntityNotFoundError
@@ -11,6 +13,12 @@ MOCK_TRACK = SpotifyTrack(
     album_name="Mock Album", href="http://api/t", uri="spotify:track:1"
 )
 
+RAW_TRACK = {
+    "id": "456", "name": "Mock Song", "popularity": 50, "duration_ms": 3000, "explicit": False,
+    "artists": [{"id": "123", "name": "Mock Band", "href": "http://api/1", "uri": "spotify:artist:1"}],
+    "album": {"name": "Mock Album"}, "href": "http://api/t", "uri": "spotify:track:1"
+}
+
 
 class TestSpotifyIntegration:
 
@@ -77,3 +85,74 @@ class TestSpotifyIntegration:
 
         assert response.status_code == 200
         mock_follow.assert_called_once()
+
+    @patch("app.services.SpotifyService.find_artist_to_save")
+    def test_duplicate_favorite_is_stored_once(self, mock_find, client, created_user):
+        user_id = created_user["id"]
+        mock_find.return_value = MOCK_ARTIST
+
+        client.post(f"/users/{user_id}/favorites/artists?artist_name=Band")
+        client.post(f"/users/{user_id}/favorites/artists?artist_name=Band")
+
+        assert len(client.get(f"/users/{user_id}").json()["favorite_artists"]) == 1
+
+    @patch("app.services.SpotifyService.find_artist_to_save")
+    def test_artist_fans_follow_adds_removals_and_deletes(self, mock_find, client, sample_user_payload):
+        mock_find.return_value = MOCK_ARTIST
+        first = client.post("/users/", json=sample_user_payload).json()["id"]
+        second = client.post("/users/", json=sample_user_payload).json()["id"]
+        third = client.post("/users/", json=sample_user_payload).json()["id"]
+        for user_id in (first, second, third):
+            client.post(f"/users/{user_id}/favorites/artists?artist_name=Band")
+
+        client.delete(f"/users/{first}/favorites/artists/{MOCK_ARTIST.id}")
+        client.delete(f"/users/{third}")
+
+        response = client.get(f"/spotify/artists/{MOCK_ARTIST.id}/fans")
+        assert response.json()["count"] == 1
+        assert [fan["id"] for fan in response.json()["fans"]] == [second]
+        assert client.get(f"/users/{first}").json()["favorite_artists"] == []
+
+    def test_remove_missing_favorite_returns_404(self, client, created_user):
+        response = client.delete(f"/users/{created_user['id']}/favorites/tracks/unknown")
+        assert response.status_code == 404
+
+    @patch("app.spotify.client.search_raw_with_token")
+    @patch("app.spotify.tokens.ensure_valid_token")
+    def test_batch_favorite_tracks_reports_each_item(self, mock_token, mock_search, client, created_user):
+        user_id = created_user["id"]
+        mock_token.return_value = "access"
+        active = 0
+        peak = 0
+
+        async def fake_search(token, query, type_, limit=5, market=None):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            if query == "missing":
+                return b'{"tracks": {"items": []}}'
+            return json.dumps({"tracks": {"items": [RAW_TRACK]}}).encode()
+
+        mock_search.side_effect = fake_search
+
+        response = client.post(
+            f"/users/{user_id}/favorites/tracks:batch",
+            json={"names": ["song", "missing", "same song"]}
+        )
+
+        assert response.status_code == 200
+        statuses = [item["status"] for item in response.json()["items"]]
+        assert statuses == ["added", "not_found", "already_saved"]
+        assert peak > 1
+        mock_token.assert_called_once_with(user_id)
+        assert len(client.get(f"/users/{user_id}").json()["favorite_tracks"]) == 1
+
+    @patch("app.spotify.tokens.ensure_valid_token")
+    def test_batch_favorites_without_token_is_unauthorized(self, mock_token, client, created_user):
+        mock_token.return_value = None
+
+        response = client.post(f"/users/{created_user['id']}/favorites/artists:batch", json={"names": ["Band"]})
+
+        assert response.status_code == 401
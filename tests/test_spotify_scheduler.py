@@ -0,0 +1,108 @@
+from unittest.mock import patch, AsyncMock
+
+import httpx
+import pytest
+
+from app.errors import UpstreamRateLimitError
+from app.spotify.scheduler import SpotifyScheduler
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_scheduler(fake_time, **overrides):
+    options = dict(rate=100, burst=10, max_concurrency=4, max_retries=3,
+                   backoff_base=0.1, backoff_max=1.0, max_retry_after=30)
+    options.update(overrides)
+    return SpotifyScheduler(clock=fake_time.clock, sleep=fake_time.sleep, **options)
+
+
+def responses(*statuses, headers=None):
+    queue = [httpx.Response(code, headers=headers or {}) for code in statuses]
+
+    async def send():
+        return queue.pop(0)
+
+    return send
+
+
+class TestSpotifyScheduler:
+
+    @pytest.mark.asyncio
+    async def test_honors_retry_after_before_retrying(self):
+        fake_time = FakeTime()
+        scheduler = make_scheduler(fake_time)
+
+        resp = await scheduler.send(responses(429, 200, headers={"Retry-After": "2"}))
+
+        assert resp.status_code == 200
+        assert fake_time.now >= 2
+        assert scheduler.throttled == 1
+        assert scheduler.retries == 1
+
+    @pytest.mark.asyncio
+    async def test_long_retry_after_blocks_later_requests(self):
+        fake_time = FakeTime()
+        scheduler = make_scheduler(fake_time, max_retry_after=30)
+        calls = []
+
+        async def banned():
+            calls.append(fake_time.now)
+            return httpx.Response(429, headers={"Retry-After": "120"})
+
+        first = await scheduler.send(banned)
+        fake_time.now += 10
+        second = await scheduler.send(banned)
+
+        assert first.status_code == second.status_code == 429
+        assert len(calls) == 1
+        assert second.headers["Retry-After"] == "110"
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        fake_time = FakeTime()
+        scheduler = make_scheduler(fake_time, max_retries=2)
+
+        resp = await scheduler.send(responses(503, 503, 503))
+
+        assert resp.status_code == 503
+        assert scheduler.requests == 3
+        assert scheduler.server_errors == 2
+        assert all(delay <= 1.0 for delay in fake_time.sleeps)
+
+    @pytest.mark.asyncio
+    async def test_token_bucket_smooths_bursts(self):
+        fake_time = FakeTime()
+        scheduler = make_scheduler(fake_time, rate=10, burst=2)
+
+        for _ in range(4):
+            await scheduler.send(responses(200))
+
+        # two requests fit in the burst, the next two wait 0.1s each for a token
+        assert fake_time.now == pytest.approx(0.2)
+        assert scheduler.stats()["max_wait_seconds"] == pytest.approx(0.1)
+
+    def test_exhausted_rate_limit_returns_503_with_retry_after(self, client, created_user):
+        with patch("app.services.SpotifyService.find_track_to_save",
+                   new=AsyncMock(side_effect=UpstreamRateLimitError("Spotify", 5))):
+            response = client.post(f"/users/{created_user['id']}/favorites/tracks?track_name=song")
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+
+    def test_follow_rate_limit_returns_503_with_retry_after(self, client, created_user):
+        with patch("app.spotify.client.follow_ids", new=AsyncMock(side_effect=UpstreamRateLimitError("Spotify", 5))):
+            response = client.put(f"/spotify/me/following?user_id={created_user['id']}&type=artist", json=["a1"])
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
@@ -0,0 +1,59 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.database import token_store
+from app.spotify import tokens
+from tests.helpers import make_token
+
+
+class TestTokenRefresh:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_refresh(self):
+        token_store[1] = make_token("old", age_seconds=4000)
+        calls = 0
+
+        async def slow_refresh(refresh_token):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return make_token("new")
+
+        with patch("app.spotify.tokens.refresh_token_with_refresh_token", side_effect=slow_refresh):
+            results = await asyncio.gather(*(tokens.ensure_valid_token(1) for _ in range(10)))
+
+        assert calls == 1
+        assert results == ["new"] * 10
+        assert token_store[1].access_token == "new"
+
+    @pytest.mark.asyncio
+    async def test_background_pass_refreshes_tokens_before_expiry(self):
+        token_store[1] = make_token("soon", age_seconds=3400)
+        token_store[2] = make_token("fresh")
+
+        async def refresh(refresh_token):
+            return make_token("renewed")
+
+        with patch("app.spotify.tokens.refresh_token_with_refresh_token", side_effect=refresh) as mock_refresh:
+            refreshed = await tokens.refresh_expiring_tokens(margin_seconds=300)
+
+        assert refreshed == 1
+        mock_refresh.assert_called_once()
+        assert token_store[1].access_token == "renewed"
+        assert token_store[2].access_token == "fresh"
+        assert not token_store[1].is_expired()
+
+    @pytest.mark.asyncio
+    async def test_newer_login_is_not_overwritten_by_refresh(self):
+        token_store[1] = make_token("old", age_seconds=4000)
+
+        async def refresh(refresh_token):
+            token_store[1] = make_token("relogged")
+            return make_token("refreshed")
+
+        with patch("app.spotify.tokens.refresh_token_with_refresh_token", side_effect=refresh):
+            access_token = await tokens.ensure_valid_token(1)
+
+        assert access_token == "relogged"
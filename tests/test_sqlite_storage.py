@@ -0,0 +1,88 @@
+import pytest
+
+from app.database.sqlite import SQLiteStorage
+from app.models import User, SpotifyArtist
+from tests.helpers import make_token
+
+
+def make_user(storage: SQLiteStorage, name: str) -> User:
+    return storage.users.add(User(id=storage.users.next_id(), name=name, age=30, music_preferences=["Rock"]))
+
+
+class TestSQLiteStorage:
+
+    @pytest.mark.asyncio
+    async def test_users_and_tokens_survive_restart(self, tmp_path):
+        path = str(tmp_path / "app.db")
+        storage = SQLiteStorage(path)
+        await storage.startup()
+
+        first = make_user(storage, "Ana")
+        second = make_user(storage, "Luis")
+        first.favorite_artists.append(SpotifyArtist(id="a1", name="Band", href="h", uri="u"))
+        storage.users.update(first)
+        storage.users.delete(second.id)
+        storage.tokens[first.id] = make_token("access")
+        await storage.shutdown()
+
+        reopened = SQLiteStorage(path)
+        await reopened.startup()
+
+        assert len(reopened.users) == 1
+        assert reopened.users.get(first.id).favorite_artists[0].id == "a1"
+        assert reopened.tokens[first.id].access_token == "access"
+        # the deleted id is never handed out again
+        assert reopened.users.next_id() == 3
+        await reopened.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_storage_can_restart_after_shutdown(self, tmp_path):
+        path = str(tmp_path / "app.db")
+        storage = SQLiteStorage(path)
+        await storage.startup()
+        make_user(storage, "Ana")
+        await storage.shutdown()
+
+        await storage.startup()
+        make_user(storage, "Luis")
+        await storage.shutdown()
+
+        reopened = SQLiteStorage(path)
+        await reopened.startup()
+        assert [user.name for user in reopened.users] == ["Ana", "Luis"]
+        await reopened.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_writes_are_batched(self, tmp_path):
+        storage = SQLiteStorage(str(tmp_path / "app.db"), batch_size=1000)
+        await storage.startup()
+        for index in range(200):
+            make_user(storage, f"User {index}")
+        await storage.flush()
+
+        stats = storage.stats()
+        assert stats["writes"] == 400
+        assert stats["batches"] < 50
+        await storage.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_retried_then_only_bad_writes_are_lost(self, tmp_path):
+        storage = SQLiteStorage(str(tmp_path / "app.db"), batch_size=1000)
+        storage._writer._retry_delay = 0
+        await storage.startup()
+        make_user(storage, "Ana")
+        # a write SQLite will always reject, queued between two good ones
+        storage._writer.submit("INSERT INTO missing_table VALUES (?)", (1,))
+        make_user(storage, "Luis")
+        await storage.flush()
+
+        stats = storage.stats()
+        assert stats["failed_writes"] == 1
+        assert stats["retried_batches"] >= 1
+        assert "missing_table" in stats["last_error"]
+        await storage.shutdown()
+
+        reopened = SQLiteStorage(str(tmp_path / "app.db"))
+        await reopened.startup()
+        assert [user.name for user in reopened.users] == ["Ana", "Luis"]
+        await reopened.shutdown()
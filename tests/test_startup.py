@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+WITHOUT_SPOTIFY = """
+import sys
+import main
+assert "httpx" not in sys.modules, "importing the app loaded httpx"
+assert "app.spotify.client" not in sys.modules
+
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    assert client.post("/users/", json={"name": "Ana", "age": 30}).status_code == 201
+    assert client.get("/users/").status_code == 200
+    assert client.get("/spotify/auth/1/login").status_code == 502
+print("ok")
+"""
+
+
+def test_app_starts_without_spotify_credentials(tmp_path):
+    env = {key: value for key, value in os.environ.items() if not key.startswith("SPOTIFY_")}
+    env["PYTHONPATH"] = str(ROOT)
+    # run from an empty directory so a developer's .env can't supply the credentials
+    result = subprocess.run([sys.executable, "-c", WITHOUT_SPOTIFY], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "ok"
@@ -0,0 +1,72 @@
+import random
+from collections import Counter
+
+from app.indexes import RankedCounter
+from app.models import SpotifyArtist
+from app.services import UserService
+
+
+def _artist(artist_id: str, name: str) -> SpotifyArtist:
+    return SpotifyArtist(id=artist_id, name=name, href="h", uri="u")
+
+
+class TestRankedCounter:
+
+    def test_matches_a_plain_counter_under_random_updates(self):
+        rng = random.Random(3)
+        counter, expected = RankedCounter(), Counter()
+        for _ in range(5000):
+            key = rng.randrange(30)
+            if rng.random() < 0.6:
+                counter.increment(key)
+                expected[key] += 1
+            else:
+                counter.decrement(key)
+                if expected[key]:
+                    expected[key] -= 1
+            expected += Counter()  # drop zero counts
+
+            top = counter.top(5)
+            assert [count for _, count in top] == sorted(expected.values(), reverse=True)[:5]
+            assert all(expected[key] == count for key, count in top)
+        assert len(counter) == len(expected)
+        assert dict(counter.top()) == dict(expected)
+
+    def test_ties_keep_the_order_they_were_reached(self):
+        counter = RankedCounter()
+        for key in ("b", "a", "a", "b", "c"):
+            counter.increment(key)
+        assert counter.top() == [("a", 2), ("b", 2), ("c", 1)]
+
+
+class TestStatsRoutes:
+
+    def test_genre_counts_follow_user_changes(self, client):
+        client.post("/users/", json={"name": "Ana Lopez", "age": 25, "music_preferences": ["Rock", "Pop"]})
+        client.post("/users/", json={"name": "Luis Gil", "age": 30, "music_preferences": ["rock"]})
+        client.post("/users/", json={"name": "Eva Ruiz", "age": 30, "music_preferences": ["Jazz", "Pop"]})
+
+        assert client.get("/stats/genres").json() == [
+            {"genre": "rock", "users": 2}, {"genre": "Pop", "users": 2}, {"genre": "Jazz", "users": 1}]
+
+        client.put("/users/2", json={"name": "Luis Gil", "age": 30, "music_preferences": ["Jazz"]})
+        client.delete("/users/1")
+        assert client.get("/stats/genres?k=1").json() == [{"genre": "Jazz", "users": 2}]
+
+    def test_top_artists_counts_favorites(self, client, sample_user_payload):
+        for _ in range(3):
+            client.post("/users/", json=sample_user_payload)
+        UserService.add_favorite_artist(1, _artist("a1", "Muse"))
+        UserService.add_favorite_artist(2, _artist("a1", "Muse"))
+        UserService.add_favorite_artist(2, _artist("a2", "Blur"))
+        UserService.add_favorite_artist(3, _artist("a3", "Oasis"))
+        UserService.remove_favorite_artist(3, "a3")
+
+        response = client.get("/stats/top-artists?k=5")
+        assert response.status_code == 200
+        assert response.json() == [{"id": "a1", "name": "Muse", "favorites": 2},
+                                   {"id": "a2", "name": "Blur", "favorites": 1}]
+
+        client.delete("/users/2")
+        assert client.get("/stats/top-artists?k=1").json() == [{"id": "a1", "name": "Muse", "favorites": 1}]
+        assert client.get("/stats/top-tracks").json() == []
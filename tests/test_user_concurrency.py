@@ -0,0 +1,153 @@
+import asyncio
+from collections import defaultdict
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.locks import KeyedLock
+from app.models import SpotifyArtist
+from app.services import UserService
+from main import app
+
+
+def _artist(name: str) -> SpotifyArtist:
+    artist_id = name.lower()
+    return SpotifyArtist(id=artist_id, name=name, href=f"https://api.spotify.com/v1/artists/{artist_id}",
+                         uri=f"spotify:artist:{artist_id}")
+
+
+class SlowSearch:
+    # stands in for the Spotify lookup and records how many lookups overlap, per user and overall
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.active = defaultdict(int)
+        self.peak = defaultdict(int)
+        self.total_active = 0
+        self.total_peak = 0
+
+    async def __call__(self, user_id: int, name: str):
+        self.active[user_id] += 1
+        self.total_active += 1
+        self.peak[user_id] = max(self.peak[user_id], self.active[user_id])
+        self.total_peak = max(self.total_peak, self.total_active)
+        await asyncio.sleep(self.delay)
+        self.active[user_id] -= 1
+        self.total_active -= 1
+        return _artist(name)
+
+
+def _async_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def _create_users(client: httpx.AsyncClient, count: int):
+    ids = []
+    for i in range(count):
+        response = await client.post("/users/", json={"name": f"User {chr(65 + i)}", "age": 30})
+        ids.append(response.json()["id"])
+    return ids
+
+
+class TestKeyedLock:
+
+    @pytest.mark.asyncio
+    async def test_entries_are_evicted_when_idle(self):
+        locks = KeyedLock()
+
+        async def worker(key):
+            async with locks.hold(key):
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(worker(key % 3) for key in range(30)))
+        assert len(locks) == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_leak(self):
+        locks = KeyedLock()
+        async with locks.hold("k"):
+            waiter = asyncio.create_task(locks.hold("k").__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        assert len(locks) == 0
+
+
+class TestPerUserLocking:
+
+    @pytest.mark.asyncio
+    async def test_same_user_writes_run_one_at_a_time(self):
+        search = SlowSearch()
+        async with _async_client() as client:
+            user_id, = await _create_users(client, 1)
+            with patch("app.services.SpotifyService.find_artist_to_save", new=search):
+                responses = await asyncio.gather(*(
+                    client.post(f"/users/{user_id}/favorites/artists", params={"artist_name": f"Band{i}"})
+                    for i in range(10)))
+
+        assert all(r.status_code == 200 for r in responses)
+        assert search.peak[user_id] == 1
+        assert len(UserService.get_user(user_id).favorite_artists) == 10
+        assert len(UserService.user_locks) == 0
+
+    @pytest.mark.asyncio
+    async def test_different_users_write_in_parallel(self):
+        search = SlowSearch()
+        async with _async_client() as client:
+            user_ids = await _create_users(client, 5)
+            with patch("app.services.SpotifyService.find_artist_to_save", new=search):
+                responses = await asyncio.gather(*(
+                    client.post(f"/users/{user_id}/favorites/artists", params={"artist_name": f"Band{i}"})
+                    for user_id in user_ids for i in range(4)))
+
+        assert all(r.status_code == 200 for r in responses)
+        assert all(search.peak[user_id] == 1 for user_id in user_ids)
+        assert search.total_peak == len(user_ids)
+        assert len(UserService.user_locks) == 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_batches_add_each_favorite_once(self):
+        async def find_all(user_id, names):
+            await asyncio.sleep(0.01)
+            return [_artist(name) for name in names]
+
+        async with _async_client() as client:
+            user_id, = await _create_users(client, 1)
+            with patch("app.services.SpotifyService.find_artists_to_save", new=find_all):
+                responses = await asyncio.gather(*(
+                    client.post(f"/users/{user_id}/favorites/artists:batch", json={"names": ["Muse", "Blur"]})
+                    for _ in range(8)))
+
+        statuses = [item["status"] for r in responses for item in r.json()["items"]]
+        assert statuses.count("added") == 2
+        assert statuses.count("already_saved") == 14
+        assert [a.id for a in UserService.get_user(user_id).favorite_artists] == ["muse", "blur"]
+
+
+class TestIfMatch:
+
+    def test_stale_etag_is_rejected(self, client, created_user):
+        user_id = created_user["id"]
+        etag = client.get(f"/users/{user_id}").headers["ETag"]
+        payload = {"name": "Renamed User", "age": 40}
+
+        first = client.put(f"/users/{user_id}", json=payload, headers={"If-Match": etag})
+        assert first.status_code == 200
+        assert first.headers["ETag"] != etag
+
+        stale = client.put(f"/users/{user_id}", json={"name": "Other Name", "age": 41}, headers={"If-Match": etag})
+        assert stale.status_code == 412
+        assert stale.json()["error"] == "Precondition Failed"
+        assert client.get(f"/users/{user_id}").json()["name"] == "Renamed User"
+
+        assert client.delete(f"/users/{user_id}", headers={"If-Match": etag}).status_code == 412
+        assert client.delete(f"/users/{user_id}", headers={"If-Match": first.headers["ETag"]}).status_code == 200
+
+    def test_weak_etag_never_satisfies_if_match(self, client, created_user):
+        user_id = created_user["id"]
+        etag = client.get(f"/users/{user_id}").headers["ETag"]
+
+        response = client.put(f"/users/{user_id}", json={"name": "Renamed User", "age": 40},
+                              headers={"If-Match": f"W/{etag}"})
+        assert response.status_code == 412